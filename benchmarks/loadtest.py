@@ -0,0 +1,291 @@
+'''
+FlexMusic server load test\n
+Starts a FlexMusic server backed by the deterministic fake extractor, drives it with many concurrent client connections, and reports throughput, latency percentiles, server memory and process count.\n
+Results are written to benchmarks/results/ as JSON. Passing --baseline compares the run against an earlier result, by default the reference run checked in as benchmarks/baseline.json, and exits with status 1 on a regression.\n
+\n
+Usage: python benchmarks/loadtest.py [--baseline [result.json]]
+'''
+
+# Import dependencies
+import argparse, asyncio, json, os, platform, random, signal, socket, subprocess, sys, time
+from struct import Struct
+from zlib import decompress
+
+# Paths
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_DIR = os.path.join(ROOT, "server")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# Wire protocol constants, mirrored from the client library so the harness has no Discord dependency
+PROTOCOL_VERSION = 2
+HEADER = Struct("!Q")
+COMPRESSED = 1 << 63
+
+class LoadClient(object):
+    '''Minimal pipelining FlexMusic client speaking the JSON encoding of the wire protocol'''
+
+    def __init__(self):
+        self.reader, self.writer = None, None
+        self._pending = {}
+        self._next_id = 0
+        self._reader_task = None
+
+    async def connect(self, host: str, port: int):
+        self.reader, self.writer = await asyncio.open_connection(host, port, limit=1024 * 1024)
+        self._send({"flexmusic": PROTOCOL_VERSION, "encodings": ["json"], "compression": ["zlib"]})
+        reply = await self._read()
+        if reply.get("success") is not True:
+            raise RuntimeError(f"Handshake rejected: {reply}")
+        self._reader_task = asyncio.create_task(self._read_responses())
+
+    def _send(self, message: dict):
+        body = json.dumps(message, separators=(",", ":")).encode()
+        self.writer.write(HEADER.pack(len(body)) + body)
+
+    async def _read(self) -> dict:
+        (length,) = HEADER.unpack(await self.reader.readexactly(HEADER.size))
+        body = await self.reader.readexactly(length & ~COMPRESSED)
+        return json.loads(decompress(body) if length & COMPRESSED else body)
+
+    async def _read_responses(self):
+        try:
+            while True:
+                resp = await self._read()
+                if (future := self._pending.pop(resp.get("id"), None)) is not None and not future.done():
+                    future.set_result(resp)
+        except (asyncio.IncompleteReadError, ConnectionError) as error:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(str(error)))
+            self._pending.clear()
+
+    async def request(self, service: str, operation: str, payload: dict) -> dict:
+        id = self._next_id
+        self._next_id += 1
+        self._pending[id] = future = asyncio.get_running_loop().create_future()
+        self._send({"id": id, "service": service, "operation": operation, "payload": payload})
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _process_tree(pid: int) -> list[int]:
+    # Linux only: walks /proc to find every descendant of the server process
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as file:
+                    ppid = int(file.read().rsplit(")", 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    tree, stack = [], [pid]
+    while stack:
+        tree.append(current := stack.pop())
+        stack.extend(children.get(current, ()))
+    return tree
+
+def _resource_usage(pid: int) -> dict:
+    '''Returns the process count and summed resident memory of the server and its workers'''
+    if not os.path.isdir("/proc"):
+        return {"processes": None, "rss_mb": None}
+    rss = 0
+    tree = _process_tree(pid)
+    for member in tree:
+        try:
+            with open(f"/proc/{member}/status") as file:
+                for line in file:
+                    if line.startswith("VmRSS:"):
+                        rss += int(line.split()[1])
+        except OSError:
+            pass
+    return {"processes": len(tree), "rss_mb": round(rss / 1024, 1)}
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def _summary(latencies: list[float]) -> dict:
+    return {
+        "count": len(latencies),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p90_ms": round(_percentile(latencies, 0.90) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 2)
+    }
+
+def _next_request(rng: random.Random, args) -> tuple[str, dict]:
+    # Query popularity follows a Zipf-like curve, matching traffic where a few hundred tracks make up most plays
+    roll = rng.random()
+    if roll < args.playlist_ratio:
+        return "get", {"url": f"https://www.youtube.com/playlist?list=PL{rng.randrange(args.playlists)}", "limit": args.page_size}
+    query = f"song {int(rng.paretovariate(1.2)) % args.queries}"
+    if roll < args.playlist_ratio + args.metadata_ratio:
+        return "search", {"query": query, "amount": args.amount, "resolve": False}
+    return "search", {"query": query, "amount": args.amount}
+
+async def _worker(client: LoadClient, rng: random.Random, args, deadline: float, results: dict):
+    while time.perf_counter() < deadline:
+        operation, payload = _next_request(rng, args)
+        start = time.perf_counter()
+        try:
+            resp = await client.request("youtube", operation, payload)
+            outcome = "ok" if resp.get("success") is True else "overloaded" if resp.get("code") == "overloaded" else "error"
+        except ConnectionError:
+            outcome = "disconnected"
+        elapsed = time.perf_counter() - start
+        results["latency"].setdefault(operation, []).append(elapsed)
+        results["outcomes"][outcome] = results["outcomes"].get(outcome, 0) + 1
+
+async def _sample_resources(pid: int, samples: list[dict], stop: asyncio.Event):
+    while not stop.is_set():
+        samples.append(_resource_usage(pid))
+        try:
+            await asyncio.wait_for(stop.wait(), 1)
+        except asyncio.TimeoutError:
+            pass
+
+async def _run(args, port: int, pid: int) -> dict:
+    clients = []
+    for _ in range(args.connections):
+        client = LoadClient()
+        await client.connect("127.0.0.1", port)
+        clients.append(client)
+    results = {"latency": {}, "outcomes": {}}
+    samples, stop = [], asyncio.Event()
+    sampler = asyncio.create_task(_sample_resources(pid, samples, stop))
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*[_worker(client, random.Random(f"{args.seed}:{index}:{slot}"), args, deadline, results) for index, client in enumerate(clients) for slot in range(args.pipeline)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+    stats = (await clients[0].request("server", "stats", {}))["response"]
+    for client in clients:
+        await client.close()
+    everything = [value for values in results["latency"].values() for value in values]
+    return {
+        "throughput_rps": round(len(everything) / elapsed, 2),
+        "latency": {"all": _summary(everything), **{operation: _summary(values) for operation, values in results["latency"].items()}},
+        "outcomes": results["outcomes"],
+        "peak_rss_mb": max((sample["rss_mb"] or 0 for sample in samples), default=None),
+        "peak_processes": max((sample["processes"] or 0 for sample in samples), default=None),
+        "server": {key: stats.get(key) for key in ("search_cache", "stream_cache", "coalescing", "gauges")}
+    }
+
+def _start_server(args, port: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    # Every simulated client connects from this host, so per-host admission limits are lifted unless set explicitly
+    for name in ("FLEXMUSIC_CLIENT_MAX_INFLIGHT", "FLEXMUSIC_CLIENT_RATE", "FLEXMUSIC_CLIENT_BURST"):
+        env.setdefault(name, "1000000")
+    env.update({
+        "FLEXMUSIC_HOST": "127.0.0.1",
+        "FLEXMUSIC_PORT": str(port),
+        "FLEXMUSIC_EXTRACTOR": "fake",
+        "FLEXMUSIC_FAKE_LATENCY": str(args.latency),
+        "FLEXMUSIC_FAKE_PAYLOAD_SIZE": str(args.payload_size),
+        "FLEXMUSIC_FAKE_FAILURE_RATE": str(args.failure_rate),
+        "FLEXMUSIC_FAKE_PLAYLIST_SIZE": str(args.playlist_size),
+        "FLEXMUSIC_LOG_LEVEL": "WARNING"
+    })
+    server = subprocess.Popen([sys.executable, "server.py"], cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError("Server exited during startup")
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("Server did not start listening within 30 seconds")
+
+def _compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    '''Returns a description of every metric that regressed by more than the tolerance against the baseline'''
+    regressions = []
+    if result["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(f"throughput {result['throughput_rps']} rps < baseline {baseline['throughput_rps']} rps")
+    for key in ("p50_ms", "p99_ms"):
+        now, before = result["latency"]["all"][key], baseline["latency"]["all"][key]
+        if before and now > before * (1 + tolerance):
+            regressions.append(f"{key} {now} > baseline {before}")
+    if baseline.get("peak_rss_mb") and result.get("peak_rss_mb") and result["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        regressions.append(f"peak RSS {result['peak_rss_mb']} MB > baseline {baseline['peak_rss_mb']} MB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a FlexMusic server backed by the fake extractor")
+    parser.add_argument("--connections", type=int, default=50, help="concurrent client connections")
+    parser.add_argument("--pipeline", type=int, default=2, help="requests kept in flight on each connection")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to generate load for")
+    parser.add_argument("--queries", type=int, default=500, help="distinct search queries")
+    parser.add_argument("--amount", type=int, default=5, help="results per search")
+    parser.add_argument("--playlists", type=int, default=20, help="distinct playlists")
+    parser.add_argument("--page-size", type=int, default=50, help="playlist entries per get request")
+    parser.add_argument("--playlist-ratio", type=float, default=0.05, help="share of requests that are playlist gets")
+    parser.add_argument("--metadata-ratio", type=float, default=0.3, help="share of requests that are metadata-only searches")
+    parser.add_argument("--latency", type=float, default=0.2, help="mean fake extraction latency, in seconds")
+    parser.add_argument("--payload-size", type=int, default=1000, help="fake stream URL size, in bytes")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of fake extractions that fail")
+    parser.add_argument("--playlist-size", type=int, default=300, help="entries per fake playlist")
+    parser.add_argument("--seed", default="flexmusic", help="seed of the generated workload")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE, help="earlier result to compare against (default: benchmarks/baseline.json)")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression against the baseline")
+    args = parser.parse_args()
+
+    port = _free_port()
+    server = _start_server(args, port)
+    try:
+        result = asyncio.run(_run(args, port, server.pid))
+    finally:
+        # SIGINT triggers the server's graceful shutdown, which also closes the extraction pool
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    result["config"] = {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "tolerance")}
+    result["environment"] = {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+    result["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as file:
+        json.dump(result, file, indent=2)
+
+    print(f"Throughput: {result['throughput_rps']} requests/s")
+    for operation, summary in result["latency"].items():
+        print(f"Latency ({operation}): p50 {summary['p50_ms']} ms, p90 {summary['p90_ms']} ms, p99 {summary['p99_ms']} ms over {summary['count']} requests")
+    print(f"Outcomes: {result['outcomes']}")
+    print(f"Peak server memory: {result['peak_rss_mb']} MB across {result['peak_processes']} processes")
+    print(f"Result written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("config") != result["config"]:
+            print("Warning: the baseline was run with different options, so the comparison may not be meaningful")
+        regressions = _compare(result, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -11,4 +11,5 @@ from .src.exception import Exception
 from .src.fmclient import FMClient
 from .src.fmplayer import FMPlayer
 from .src.track import Track
+from .src.playlist import PlaylistCursor
 from . import util
\ No newline at end of file
@@ -0,0 +1,42 @@
+# Import dependencies
+from collections import deque
+from discord import AudioSource
+
+class _BufferedAudio(AudioSource):
+    '''
+    Audio source wrapper that can read the first frames of its source before playback starts, and counts the frames played.\n
+    For internal use only
+    '''
+
+    # Length of one frame of audio, in seconds
+    FRAME_LENGTH = 0.02
+
+    def __init__(self, source: AudioSource):
+        self.source = source
+        self.frames = 0
+        self._buffer = deque()
+
+    @property
+    def elapsed(self) -> float:
+        '''Seconds of audio played so far'''
+        return self.frames * self.FRAME_LENGTH
+
+    def fill(self, frames: int):
+        '''Reads ahead until the given number of frames is buffered or the source ends. Blocks, so it must not run on the event loop'''
+        while len(self._buffer) < frames:
+            data = self.source.read()
+            self._buffer.append(data)
+            if not data:
+                return
+
+    def read(self) -> bytes:
+        data = self._buffer.popleft() if self._buffer else self.source.read()
+        if data:
+            self.frames += 1
+        return data
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self):
+        self.source.cleanup()
@@ -1,26 +1,63 @@
+# Import dependencies
+import asyncio
+
 class _ClientRequestScheduler(object):
     '''
     Request scheduler for FlexMusic client.\n
+    Assigns an ID to every request and holds a future per in-flight request, which is resolved when the response carrying the same ID arrives.\n
+    Streaming requests hold a queue instead, which receives every partial response until the end of the stream.\n
     For internal use only
     '''
 
     def __init__(self):
-        self._job_queue = []
-        self._finished_jobs = 0
+        self._pending = {}
+        self._streams = {}
+        self._next_id = 0
 
     @property
     def latest_job_id(self) -> int:
-        return len(self._job_queue)
+        return self._next_id
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending) + len(self._streams)
 
-    def queue_job(self) -> int:
-        self._job_queue.append(job_id := int(len(self._job_queue)))
+    def _new_id(self) -> int:
+        job_id = self._next_id
+        self._next_id += 1
         return job_id
 
-    def finish_job(self):
-        self._finished_jobs += 1
+    def queue_job(self) -> tuple[int, asyncio.Future]:
+        job_id = self._new_id()
+        self._pending[job_id] = future = asyncio.get_running_loop().create_future()
+        return job_id, future
 
-    def ready(self, id) -> bool:
-        if id == self._finished_jobs:
+    def queue_stream(self) -> tuple[int, asyncio.Queue]:
+        job_id = self._new_id()
+        self._streams[job_id] = queue = asyncio.Queue()
+        return job_id, queue
+
+    def finish_job(self, id: int, response: dict) -> bool:
+        if (queue := self._streams.get(id)) is not None:
+            if response.get("partial") is not True:
+                del self._streams[id]
+            queue.put_nowait(response)
             return True
-        else:
-            False
\ No newline at end of file
+        future = self._pending.pop(id, None)
+        if future is None or future.done():
+            return False
+        future.set_result(response)
+        return True
+
+    def discard_job(self, id: int):
+        self._pending.pop(id, None)
+        self._streams.pop(id, None)
+
+    def fail_all(self, error: BaseException):
+        pending, self._pending = self._pending, {}
+        streams, self._streams = self._streams, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+        for queue in streams.values():
+            queue.put_nowait(error)
@@ -0,0 +1,230 @@
+# Import dependencies
+import asyncio
+from hashlib import blake2b
+from random import random
+from time import monotonic
+
+# Import local dependencies
+from .exception import Exception
+from ._clientrequestscheduler import _ClientRequestScheduler
+from ._protocol import READ_LIMIT, DECODE_ERRORS, read_frame, write_frame, handshake
+
+# Delay before the first reconnection attempt, doubling after every failed attempt up to the maximum, and how long a single attempt may take
+RECONNECT_DELAY = 0.5
+MAX_RECONNECT_DELAY = 30
+CONNECT_TIMEOUT = 10
+
+# Seconds without any frame from the server after which a heartbeat ping is sent, and how long the ping may take before the connection is dropped
+HEARTBEAT_INTERVAL = 15
+HEARTBEAT_TIMEOUT = 10
+
+# Consecutive failures (dropped connections) after which a node is taken out of rotation, and for how long it is taken out at first;
+# the cooldown doubles each time the node is ejected again without a successful response in between
+EJECT_FAILURES = 3
+EJECT_COOLDOWN = 5
+MAX_EJECT_COOLDOWN = 120
+
+class _Connection(object):
+    '''
+    Connection to a single FlexMusic server node.\n
+    Multiplexes requests over one TCP connection, tracks how many of them are outstanding, and reconnects in the background with exponential backoff whenever the connection drops. Idle connections are checked with heartbeat pings, and a connection whose server stops answering is dropped. Nodes that keep failing are ejected from rotation for a cooldown.\n
+    For internal use only
+    '''
+
+    def __init__(self, host: str, port: int, debug: bool = False):
+        self.host, self.port = host, port
+        self.name = f"{host}:{port}"
+        self.debug = debug
+        self.read, self.write = None, None
+        self.codec = None
+        self.scheduler = _ClientRequestScheduler()
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.last_received = 0.0
+        self.latency = None
+        self.connected_event = asyncio.Event()
+        self._reader_task = None
+        self._heartbeat_task = None
+        self._maintainer = None
+
+    @property
+    def connected(self) -> bool:
+        return self._reader_task is not None and not self._reader_task.done()
+
+    @property
+    def available(self) -> bool:
+        '''Whether the node is connected and not ejected from rotation'''
+        return self.connected and monotonic() >= self.ejected_until
+
+    @property
+    def outstanding(self) -> int:
+        return self.scheduler.pending
+
+    def weight(self, key: str) -> int:
+        '''Rendezvous hashing weight of this node for a routing key; the node with the highest weight owns the key'''
+        return int.from_bytes(blake2b(f"{self.name}/{key}".encode(), digest_size=8).digest(), "big")
+
+    def start(self) -> asyncio.Task:
+        if self._maintainer is None or self._maintainer.done():
+            self._maintainer = asyncio.create_task(self._maintain())
+        return self._maintainer
+
+    async def _open(self):
+        read, write = await asyncio.open_connection(self.host, self.port, limit=READ_LIMIT)
+        try:
+            self.codec = await handshake(read, write)
+        except BaseException:
+            write.close()
+            raise
+        self.read, self.write = read, write
+        self.last_received = monotonic()
+        self._reader_task = asyncio.create_task(self._read_responses())
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self.connected_event.set()
+
+    async def _maintain(self):
+        # Keeps the node connected for the lifetime of the client. A protocol mismatch ends the task, as retrying cannot fix it
+        attempt = 0
+        while True:
+            if attempt:
+                # Jittered so that clients reconnecting to a restarted server do not all arrive at once
+                delay = min(RECONNECT_DELAY * 2 ** (attempt - 1), MAX_RECONNECT_DELAY) * (0.5 + random())
+                if self.debug:
+                    print(f"Reconnecting to {self.name} in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+            try:
+                await asyncio.wait_for(self._open(), CONNECT_TIMEOUT)
+            except (OSError, ValueError, asyncio.TimeoutError, Exception.ConnectionClosed):
+                if self.debug:
+                    print(f"Failed to connect to {self.name}")
+                attempt += 1
+                continue
+            if self.debug:
+                print(f"Connected to FlexMusic server at {self.name} successfully.")
+            await asyncio.wait([self._reader_task])
+            self._heartbeat_task.cancel()
+            self.write.close()
+            self.read, self.write = None, None
+            self.failures += 1
+            # Connections that drop again before any response arrives back off like failed attempts
+            attempt = self.failures
+            if self.failures >= EJECT_FAILURES:
+                self.eject(min(EJECT_COOLDOWN * 2 ** self.ejections, MAX_EJECT_COOLDOWN))
+                self.ejections += 1
+                self.failures = 0
+
+    def eject(self, seconds: float):
+        '''Takes the node out of rotation for the given number of seconds'''
+        self.ejected_until = max(self.ejected_until, monotonic() + seconds)
+        if self.debug:
+            print(f"Taking FlexMusic server at {self.name} out of rotation for {seconds:.1f} seconds")
+
+    async def _heartbeat(self):
+        # Pings only when the connection has been quiet, and drops a connection whose server no longer answers
+        while True:
+            await asyncio.sleep(max(0, self.last_received + HEARTBEAT_INTERVAL - monotonic()))
+            if monotonic() - self.last_received < HEARTBEAT_INTERVAL:
+                continue
+            sent = monotonic()
+            try:
+                await self.request({"service": "server", "operation": "ping", "payload": {}}, HEARTBEAT_TIMEOUT)
+            except Exception.RequestTimeout:
+                if self.debug:
+                    print(f"FlexMusic server at {self.name} missed a heartbeat, dropping the connection")
+                self.write.transport.abort()
+                return
+            except Exception.ConnectionClosed:
+                return
+            self.latency = monotonic() - sent
+
+    # Internal response reader task, resolves the pending request matching each response ID
+    async def _read_responses(self):
+        try:
+            while True:
+                frame = await read_frame(self.read)
+                # A frame that cannot be decoded leaves the stream in an unknown state, so the connection is dropped and reopened
+                try:
+                    resp = await self.codec.decode_async(*frame)
+                except DECODE_ERRORS as error:
+                    raise Exception.ConnectionClosed(f"Malformed frame from {self.name}: {error}") from error
+                if not isinstance(resp, dict):
+                    raise Exception.ConnectionClosed(f"Malformed frame from {self.name}: response is not an object")
+                self.last_received = monotonic()
+                self.failures = self.ejections = 0
+                if not self.scheduler.finish_job(resp.get("id"), resp) and self.debug:
+                    print(f"Discarded response for unknown request (Job ID: {resp.get('id')})")
+        except Exception.ConnectionClosed as error:
+            if self.debug:
+                print(f"Connection to FlexMusic server at {self.name} closed")
+            self.scheduler.fail_all(error)
+        finally:
+            self.connected_event.clear()
+
+    async def request(self, payload: dict, timeout: float = None) -> dict:
+        '''Sends a request and waits for its response. Raises RequestTimeout if the response does not arrive within timeout seconds'''
+        if not self.connected:
+            raise Exception.ConnectionClosed
+        id, future = self.scheduler.queue_job()
+        payload["id"] = id
+        if self.debug:
+            print(f"Queued client request (Job ID: {str(id)}, {self.name}, {self.scheduler.pending} in flight)")
+        try:
+            await write_frame(self.write, self.codec.encode(payload))
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise Exception.RequestTimeout(f"No response from {self.name} within {timeout:.1f} seconds")
+        except ConnectionError as error:
+            raise Exception.ConnectionClosed from error
+        finally:
+            self.scheduler.discard_job(id)
+            if self.debug:
+                print(f"Finished client request (Job ID: {str(id)}, {self.name})")
+
+    async def request_stream(self, payload: dict, timeout: float = None):
+        '''Sends a streaming request and yields each of its responses. Raises RequestTimeout if no frame arrives within timeout seconds of the previous one'''
+        if not self.connected:
+            raise Exception.ConnectionClosed
+        id, queue = self.scheduler.queue_stream()
+        payload["id"] = id
+        payload["stream"] = True
+        if self.debug:
+            print(f"Queued streaming client request (Job ID: {str(id)}, {self.name}, {self.scheduler.pending} in flight)")
+        try:
+            await write_frame(self.write, self.codec.encode(payload))
+            while True:
+                resp = await asyncio.wait_for(queue.get(), timeout)
+                if isinstance(resp, BaseException):
+                    raise resp
+                yield resp
+                if resp.get("partial") is not True:
+                    return
+        except asyncio.TimeoutError:
+            raise Exception.RequestTimeout(f"No response from {self.name} within {timeout:.1f} seconds")
+        except ConnectionError as error:
+            raise Exception.ConnectionClosed from error
+        finally:
+            self.scheduler.discard_job(id)
+            if self.debug:
+                print(f"Finished streaming client request (Job ID: {str(id)}, {self.name})")
+
+    def status(self) -> dict:
+        return {
+            "node": self.name,
+            "connected": self.connected,
+            "available": self.available,
+            "outstanding": self.outstanding,
+            "failures": self.failures,
+            "latency": None if self.latency is None else round(self.latency, 4),
+            "ejected_for": max(0.0, round(self.ejected_until - monotonic(), 1))
+        }
+
+    def close(self):
+        if self._maintainer is not None:
+            self._maintainer.cancel()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+        if self.write is not None:
+            self.write.close()
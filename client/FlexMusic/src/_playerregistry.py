@@ -0,0 +1,51 @@
+class _PlayerRegistry(object):
+    '''
+    Registry of the players of a FMClient session.\n
+    Players are indexed by the ID of their voice channel and of their guild, so every lookup is a single dictionary access. The channel index is updated when a player is moved to another channel.\n
+    For internal use only
+    '''
+
+    def __init__(self):
+        self._by_channel = {}
+        self._by_guild = {}
+        self._keys = {} # player -> (channel ID, guild ID) it is indexed under
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(list(self._keys))
+
+    def __contains__(self, player) -> bool:
+        return player in self._keys
+
+    def add(self, player):
+        self.remove(player)
+        channel_id, guild_id = player.channel.id, player.guild.id
+        self._by_channel[channel_id] = player
+        self._by_guild[guild_id] = player
+        self._keys[player] = (channel_id, guild_id)
+
+    def move(self, player):
+        '''Re-indexes the player under its current voice channel'''
+        if player in self._keys:
+            self.add(player)
+
+    def remove(self, player):
+        if (keys := self._keys.pop(player, None)) is None:
+            return
+        channel_id, guild_id = keys
+        if self._by_channel.get(channel_id) is player:
+            del self._by_channel[channel_id]
+        if self._by_guild.get(guild_id) is player:
+            del self._by_guild[guild_id]
+
+    def by_channel(self, channel_id: int):
+        return self._by_channel.get(channel_id)
+
+    def by_guild(self, guild_id: int):
+        return self._by_guild.get(guild_id)
+
+    def by_id(self, id: int):
+        '''Looks up a player by a channel ID or a guild ID'''
+        return self._by_channel.get(id) or self._by_guild.get(id)
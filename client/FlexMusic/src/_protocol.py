@@ -0,0 +1,95 @@
+# Import dependencies
+import asyncio, json, zlib
+from struct import Struct
+
+# Optional dependencies
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Import local dependencies
+from .exception import Exception
+
+# Wire protocol version, must be one of the versions accepted by the server during the handshake
+PROTOCOL_VERSION = 2
+
+# Frame header: unsigned 64-bit big-endian length of the frame body, whose top bit marks a zlib-compressed body
+HEADER = Struct("!Q")
+COMPRESSED = 1 << 63
+
+# StreamReader buffer limit; raised from the 64 KiB default so multi-megabyte frames pause the transport less often
+READ_LIMIT = 1024 * 1024
+
+# Body encodings and compression methods offered to the server, in order of preference
+ENCODINGS = ["msgpack", "json"] if msgpack is not None else ["json"]
+COMPRESSIONS = ["zlib"]
+
+# Minimum size, in bytes, of a request body before it is compressed
+COMPRESSION_THRESHOLD = 16384
+
+# Errors raised while decoding a malformed frame body
+DECODE_ERRORS = (ValueError, TypeError, zlib.error) + ((msgpack.exceptions.UnpackException,) if msgpack is not None else ())
+
+# Frames at least this many bytes long are decoded on a worker thread instead of the event loop
+OFFLOAD_THRESHOLD = 256 * 1024
+
+class _Codec(object):
+    '''
+    Serializes messages into frames and back, using the encoding and compression negotiated during the handshake.\n
+    For internal use only
+    '''
+
+    def __init__(self, encoding: str = "json", compression: None | str = None):
+        self.encoding = encoding
+        self.compression = compression
+
+    def encode(self, message: dict) -> bytes:
+        '''Returns the complete frame, header included, holding the message'''
+        if self.encoding == "msgpack":
+            body = msgpack.packb(message, use_bin_type=True)
+        else:
+            body = json.dumps(message, separators=(",", ":")).encode()
+        if self.compression is not None and len(body) >= COMPRESSION_THRESHOLD:
+            body = zlib.compress(body, 1)
+            return HEADER.pack(len(body) | COMPRESSED) + body
+        return HEADER.pack(len(body)) + body
+
+    def decode(self, body: bytes, compressed: bool = False) -> dict:
+        if compressed:
+            body = zlib.decompress(body)
+        if self.encoding == "msgpack":
+            return msgpack.unpackb(body, raw=False)
+        return json.loads(body)
+
+    async def decode_async(self, body: bytes, compressed: bool = False) -> dict:
+        '''Decodes small frames inline and large frames on a worker thread, so big responses never block the event loop'''
+        if len(body) < OFFLOAD_THRESHOLD:
+            return self.decode(body, compressed)
+        return await asyncio.get_running_loop().run_in_executor(None, self.decode, body, compressed)
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple[bytes, bool]:
+    '''Reads a single frame from the stream and returns its body and whether it is compressed. Raises ConnectionClosed if the server closes the connection'''
+    try:
+        header = await reader.readexactly(HEADER.size)
+        (length,) = HEADER.unpack(header)
+        return await reader.readexactly(length & ~COMPRESSED), bool(length & COMPRESSED)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        raise Exception.ConnectionClosed
+
+async def write_frame(writer: asyncio.StreamWriter, frame: bytes):
+    '''Writes a single frame built by _Codec.encode to the stream and waits for the write buffer to drain'''
+    writer.write(frame)
+    await writer.drain()
+
+async def handshake(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> _Codec:
+    '''
+    Performs the client side of the version handshake and returns the codec picked by the server.\n
+    Raises ProtocolMismatch if the server rejects the client version.
+    '''
+    plain = _Codec()
+    await write_frame(writer, plain.encode({"flexmusic": PROTOCOL_VERSION, "encodings": ENCODINGS, "compression": COMPRESSIONS}))
+    reply = plain.decode(*await read_frame(reader))
+    if reply.get("success") is not True:
+        raise Exception.ProtocolMismatch(f"Server speaks protocol version {reply.get('version')}, client speaks version {PROTOCOL_VERSION}")
+    return _Codec(reply.get("encoding", "json"), reply.get("compression"))
@@ -32,6 +32,14 @@ class Exception(object):
         '''Raised when a search request returns no results'''
         pass
 
+    class ConnectionClosed(ClientException):
+        '''Raised when the connection to the FlexMusic server closes while a request is being read'''
+        pass
+
+    class RequestTimeout(ClientException):
+        '''Raised when the FlexMusic server does not answer a request within its timeout'''
+        pass
+
     #
     # Server exception declarations
     #
@@ -40,6 +48,25 @@ class Exception(object):
         '''Raised when a server request fails on the server's end.'''
         pass
 
+    class UnsupportedOperation(ServerRaisedError):
+        '''Raised when the server has no such service, or the service does not support the requested operation'''
+        pass
+
+    class ProtocolMismatch(ServerException):
+        '''Raised when the server rejects the client's wire protocol version during the handshake'''
+        pass
+
+    class ServerOverloaded(ServerException):
+        '''
+        Raised when the server rejects a request because it is overloaded or the client exceeded its rate or in-flight limits
+
+        The reason attribute holds the server's explanation, and retry_after the number of seconds to wait before retrying.
+        '''
+        def __init__(self, reason: str = None, retry_after: float = 0):
+            super().__init__(reason)
+            self.reason = reason
+            self.retry_after = retry_after
+
     #
     # User eception declaration
     #
@@ -50,4 +77,8 @@ class Exception(object):
 
     class MissingURL(UserException):
         '''Raised when a function that requires a URL does not receive one'''
+        pass
+
+    class TrackNotResolved(UserException):
+        '''Raised when the audio stream of a Track is used before the Track has been resolved'''
         pass
\ No newline at end of file
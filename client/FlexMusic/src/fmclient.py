@@ -1,99 +1,202 @@
 # Import dependencies
-import asyncio, json, discord
+import asyncio, discord
+from random import random
+from time import monotonic
 
 # Import local dependencies
 from .exception import Exception
 from .track import Track
-from ._clientrequestscheduler import _ClientRequestScheduler
 from .fmplayer import FMPlayer
+from .playlist import PlaylistCursor
+from ._connection import _Connection
+from ._playerregistry import _PlayerRegistry
+
+# Outstanding requests a node may have above the least loaded node before requests it owns by key are sent elsewhere
+AFFINITY_SLACK = 8
+
+# Times a request is sent before giving up when its connection keeps dropping before the response arrives
+REQUEST_ATTEMPTS = 3
+
+# Times in a row a playlist page rejected as overloaded is requested again, after waiting as long as the server asks
+PAGE_RETRIES = 5
 
 class FMClient(object):
     '''
     FlexMusic Client (FMClient) object.\n
     By default, this client attempts to connect to localhost:5000. If the FlexMusic server you are using exists on a different port or machine, supply the "host" or "port" arguments.\n
+    To spread requests over several FlexMusic servers, supply "nodes" instead: a list of "host:port" strings or (host, port) tuples. A connection is kept open to every node. Requests for the same video, query or playlist go to the same node so its caches stay warm, unless that node is much busier than the others, in which case the least busy node is used. Nodes that drop or keep failing are taken out of rotation until they recover.\n
+    Dropped connections are reconnected automatically with exponential backoff, and idle connections are checked with heartbeats. Requests that were in flight on a dropped connection are sent again once a connection is available. Every request fails with RequestTimeout if it is not answered within "timeout" seconds (30 by default, None to wait forever); most request functions also accept their own timeout.\n
     The only required argument is a Discord bot object. This is so the FMClient can run alongside the client event loop to dispatch events and manage the connection and requests to the FlexMusic server.\n
     '''
 
-    def __init__(self, client, debug: bool = False, host: str = "localhost", port: int = 5000):
+    def __init__(self, client, debug: bool = False, host: str = "localhost", port: int = 5000, nodes: list[str | tuple[str, int]] = None, timeout: None | float = 30):
         self.client = client
-        self.read, self.write = None, None
-        self.host, self.port = host, port
-        self.scheduler = _ClientRequestScheduler()
         self.debug = debug
-        self._internal_player_cache = []
+        self.timeout = timeout
+        endpoints = []
+        for node in nodes or [(host, port)]:
+            if isinstance(node, str):
+                node_host, _, node_port = node.rpartition(":")
+                node = (node_host, int(node_port))
+            endpoints.append(node)
+        self.host, self.port = endpoints[0]
+        self.nodes = [_Connection(node_host, node_port, debug) for node_host, node_port in endpoints]
+        self._loop = None
+        self._prefetch_batch = []
+        self._internal_player_cache = _PlayerRegistry()
         if self.debug:
             print("FlexMusic Client successfully initialized")
             print("Debug mode is currently active.")
 
-    # Internal event monitoring task
-    async def _listen_for_events(self):
-        _internal_session_cache = {}
-        while True:
-            _active_clients = []
-            for voice_client in self.client.voice_clients:
-                if (voice_client := await self.get_player(voice_client.channel.id)) is not None:
-                    _active_clients.append(str(voice_client.channel.id))
-                    if str(voice_client.channel.id) not in _internal_session_cache:
-                        if self.debug:
-                            print(f"Dispatched player_join event ({str(voice_client.channel.id)})")
-                        _internal_session_cache[f"{voice_client.channel.id}"] = {}
-                        _internal_session_cache[f"{voice_client.channel.id}"]["playing"] = voice_client.is_playing()
-                        _internal_session_cache[f"{voice_client.channel.id}"]["paused"] = voice_client.is_paused()
-                        continue
-
-                    if voice_client.is_playing() is not _internal_session_cache[f"{voice_client.channel.id}"]["playing"]:
-                        if voice_client.is_playing() is False:
-                            self.client.dispatch("track_end", voice_client)
-                            if self.debug:
-                                print(f"Dispatched track_end event ({str(voice_client.channel.id)})")
-                        else:
-                            self.client.dispatch("track_start", voice_client)
-                            if self.debug:
-                                print(f"Dispatched track_start event ({str(voice_client.channel.id)})")
-                        _internal_session_cache[f"{voice_client.channel.id}"]["playing"] = voice_client.is_playing()
-
-                    if voice_client.is_paused() is not _internal_session_cache[f"{voice_client.channel.id}"]["paused"]:
-                        if voice_client.is_paused() is False:
-                            self.client.dispatch("track_pause", voice_client)
-                            if self.debug:
-                                print(f"Dispatched track_pause event ({str(voice_client.channel.id)})")
-                        else:
-                            self.client.dispatch("track_resume", voice_client)
-                            if self.debug:
-                                print(f"Dispatched track_resume event ({str(voice_client.channel.id)})")
-                        _internal_session_cache[f"{voice_client.channel.id}"]["paused"] = voice_client.is_playing()
-            
-            _temp = {}
-            for client in _internal_session_cache.keys():
-                if client in _active_clients:
-                    _temp[f"{client}"] = _internal_session_cache[f"{client}"]
-                else:
-                    self.client.dispatch("player_leave", int(client))
-                    if self.debug:
-                        print(f"Dispatched player_leave event ({client})")
-            _internal_session_cache = _temp
-            await asyncio.sleep(0.01)
-    
     # Client connection coroutine, call after event loop starts
     async def connect(self):
         '''
         Main coroutine to start the FlexMusic client and bind the connection to the event loop.\n
         This coroutine should be called after the Discord client's event loop has started (i.e. on the "on_ready" event)\n
+        It returns once at least one server node is connected; the remaining nodes keep connecting in the background.
         '''
         if self.debug:
-            print(f"Connecting to {self.host}:{self.port}...")
-        while (self.read, self.write) == (None, None):
+            print(f"Connecting to {', '.join(node.name for node in self.nodes)}...")
+        maintainers = [node.start() for node in self.nodes]
+        waiters = [asyncio.create_task(node.connected_event.wait()) for node in self.nodes]
+        try:
+            done, _ = await asyncio.wait(waiters + maintainers, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        for task in done:
+            # Node connection tasks only finish on their own when the server rejects the client's protocol version
+            if task in maintainers and not task.cancelled() and task.exception() is not None:
+                for node in self.nodes:
+                    node.close()
+                raise task.exception()
+        self._loop = asyncio.get_running_loop()
+
+    def _select(self, key: str = None, exclude: tuple = ()) -> _Connection:
+        # Ejected nodes are only used when every connected node is ejected
+        nodes = [node for node in self.nodes if node.available and node not in exclude] or [node for node in self.nodes if node.connected and node not in exclude]
+        if not nodes:
+            raise Exception.ConnectionClosed
+        least = min(nodes, key=lambda node: (node.outstanding, random()))
+        if key is None or len(nodes) == 1:
+            return least
+        # Rendezvous hashing keeps each key on the same node while the set of nodes is unchanged, bounded by the node's load
+        owner = max(nodes, key=lambda node: node.weight(key))
+        return owner if owner.outstanding <= least.outstanding + AFFINITY_SLACK else least
+
+    @staticmethod
+    def _search_key(service: str, query: str) -> str:
+        # Matches the server's search cache normalization closely enough that equivalent queries share a node
+        return f"{service}:search:{' '.join(query.casefold().split())}"
+
+    def node_status(self) -> list[dict]:
+        '''Returns the connection state, outstanding requests and health of every server node'''
+        return [node.status() for node in self.nodes]
+
+    @staticmethod
+    def _check_response(resp: dict) -> dict:
+        # Admission control rejects requests immediately with an explicit code instead of queueing them without bound
+        if resp.get("code") == "overloaded":
+            raise Exception.ServerOverloaded(resp.get("reason"), resp.get("retry_after", 0))
+        if resp.get("code") == "unsupported":
+            raise Exception.UnsupportedOperation(resp.get("error"))
+        return resp
+
+    async def _node(self, key: str, tried: list[_Connection], deadline: None | float) -> _Connection:
+        # Prefers nodes this request has not failed on yet. When no node is connected, waits for one to reconnect until the deadline
+        while True:
+            for exclude in (tried, ()):
+                try:
+                    return self._select(key, exclude)
+                except Exception.ConnectionClosed:
+                    pass
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                raise Exception.ConnectionClosed
+            if self.debug:
+                print("Waiting for a connection to a FlexMusic server...")
+            waiters = [asyncio.create_task(node.connected_event.wait()) for node in self.nodes]
+            try:
+                await asyncio.wait(waiters, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
+
+    async def _request(self, payload: dict, key: str = None, timeout: None | float = None) -> dict:
+        # Requests whose connection drops are sent again, on another node if there is one. Overloaded nodes are only retried elsewhere
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else monotonic() + timeout
+        tried, attempts = [], 0
+        while True:
+            node = await self._node(key, tried, deadline)
             try:
-                self.read, self.write = await asyncio.open_connection(self.host, self.port)
-                if self.read is not None and self.write is not None:
-                    if self.debug:
-                        print(f"Connected to FlexMusic server at {self.host}:{str(self.port)} successfully.")
-            except:
-                if self.debug:
-                    print(f"Failed to connect to {self.host}:{self.port}, retrying in 5 seconds...")
-                await asyncio.sleep(5)
-        asyncio.create_task(self._listen_for_events())
-        print("Started background event dispatcher")
+                return self._check_response(await node.request(payload, None if deadline is None else max(0, deadline - monotonic())))
+            except Exception.ServerOverloaded as error:
+                node.eject(error.retry_after)
+                tried.append(node)
+                if not any(other.connected and other not in tried for other in self.nodes):
+                    raise
+            except Exception.ConnectionClosed:
+                tried.append(node)
+                attempts += 1
+                if attempts >= REQUEST_ATTEMPTS:
+                    raise
+            if self.debug:
+                print(f"Request to {node.name} failed, retrying")
+
+    async def _request_stream(self, payload: dict, key: str = None, timeout: None | float = None):
+        # Streams are retried like requests, but only before their first frame has been yielded. The timeout applies to each frame
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else monotonic() + timeout
+        tried, attempts = [], 0
+        while True:
+            node = await self._node(key, tried, deadline)
+            started = False
+            try:
+                async for resp in node.request_stream(payload, timeout):
+                    started = True
+                    yield self._check_response(resp)
+                return
+            except Exception.ServerOverloaded as error:
+                node.eject(error.retry_after)
+                tried.append(node)
+                if started or not any(other.connected and other not in tried for other in self.nodes):
+                    raise
+            except Exception.ConnectionClosed:
+                tried.append(node)
+                attempts += 1
+                if started or attempts >= REQUEST_ATTEMPTS:
+                    raise
+            if self.debug:
+                print(f"Streaming request to {node.name} failed, retrying")
+
+    async def _iter_tracks(self, payload: dict, key: str = None, timeout: None | float = None):
+        # Paged operations report the offset of their next page in the end frame, which is requested until the server reports none
+        found, retries = False, 0
+        while True:
+            next_offset = None
+            try:
+                async for resp in self._request_stream(payload, key, timeout):
+                    if resp["success"] is not True:
+                        raise Exception.ServerRaisedError
+                    for track in Track.from_response(resp.get("response", ()), payload["service"], self):
+                        found = True
+                        yield track
+                    if resp.get("partial") is not True:
+                        next_offset = resp.get("next")
+            except Exception.ServerOverloaded as error:
+                # As in get, rejected playlist pages are requested again. A rejection always arrives before any of the page's tracks
+                retries += 1
+                if payload["operation"] != "get" or retries > PAGE_RETRIES:
+                    raise
+                await asyncio.sleep(error.retry_after)
+                continue
+            retries = 0
+            if next_offset is None:
+                break
+            payload["payload"]["offset"] = next_offset
+        if not found:
+            raise Exception.NoResultsFound
 
     #
     # Player management corountines
@@ -103,13 +206,27 @@ class FMClient(object):
         '''
         Main player creation coroutine\n
         This function creates a voice client, wraps it in a FMPlayer object, and returns it.\n
-        This will also register this player to the internal player cache of the current FMClient session.
+        This will also register this player to the internal player cache of the current FMClient session, and dispatch the player_join event.
         '''
         voice_client = await channel.connect()
-        fmplayer = FMPlayer(voice_client)
-        self._internal_player_cache.append(fmplayer)
+        fmplayer = FMPlayer(voice_client, self)
+        self._internal_player_cache.add(fmplayer)
+        fmplayer._dispatch("player_join", fmplayer)
         return fmplayer
 
+    def _forget_player(self, player: FMPlayer):
+        # Called by the player once its voice connection has been cleaned up
+        self._internal_player_cache.remove(player)
+
+    def _move_player(self, player: FMPlayer):
+        # Called by the player when it is moved to another voice channel
+        self._internal_player_cache.move(player)
+
+    @property
+    def players(self) -> list[FMPlayer]:
+        '''Every player in the internal player cache'''
+        return list(self._internal_player_cache)
+
     async def get_player(self, context: discord.VoiceChannel | discord.Guild | discord.ApplicationContext | int) -> None | FMPlayer:
         '''
         Main player fetching coroutine\n
@@ -117,27 +234,22 @@ class FMClient(object):
         If no players are found, or exist, this will return None.\n
         Note: for integer inputs, only numerical Guild/Channel IDs are accepted
         '''
-
-        if len(self._internal_player_cache) == 0:
-            return None
-
         if isinstance(context, discord.VoiceChannel):
-            for i in range(len(self._internal_player_cache)):
-                if context.id == self._internal_player_cache[i].channel.id:
-                    return self._internal_player_cache[i]
+            player = self._internal_player_cache.by_channel(context.id)
         elif isinstance(context, discord.Guild):
-            for i in range(len(self._internal_player_cache)):
-                if context.id == self._internal_player_cache[i].guild.id:
-                    return self._internal_player_cache[i]
+            player = self._internal_player_cache.by_guild(context.id)
         elif isinstance(context, discord.ApplicationContext):
-            for i in range(len(self._internal_player_cache)):
-                if context.guild.id == self._internal_player_cache[i].guild.id:
-                    return self._internal_player_cache[i]
+            player = self._internal_player_cache.by_guild(context.guild.id)
         elif isinstance(context, int):
-            for i in range(len(self._internal_player_cache)):
-                if context in [self._internal_player_cache[i].channel.id, self._internal_player_cache[i].guild.id]:
-                    return self._internal_player_cache[i]
-        return None
+            player = self._internal_player_cache.by_id(context)
+        else:
+            return None
+
+        # A player whose voice connection died without being cleaned up is no longer tracked by the Discord library either
+        if player is not None and not player.is_connected() and player.guild.voice_client is not player:
+            player.cleanup()
+            return None
+        return player
 
     async def destroy_player(self, player: FMPlayer):
         '''
@@ -154,111 +266,230 @@ class FMClient(object):
         '''
         for player in self._internal_player_cache:
             await player.destroy()
-        self._internal_player_cache = []
+            self._internal_player_cache.remove(player)
 
-    async def search(self, query: str = None, service: str = "youtube", amount: int = 10) -> list[Track]:
+    async def search(self, query: str = None, service: str = "youtube", amount: int = 10, resolve: bool = True, timeout: None | float = None) -> list[Track]:
         '''
         Main track search function.\n
         By default, this will search YouTube.\n
-        This function returns a list of Track objects found with the given query, up to the maximum amount defined.
+        This function returns a list of Track objects found with the given query, up to the maximum amount defined.\n
+        If resolve is False, only metadata is fetched and each Track's audio stream is resolved on demand (see Track.resolve).
         '''
         if query is None:
             raise Exception.MissingQuery
 
         if query.startswith("https://") or query.startswith("http://"):
-            return await self.get(query, service=service)
+            return await self.get(query, service=service, resolve=resolve, timeout=timeout)
 
         payload = {
             "service": service,
             "operation": "search",
             "payload": {
                 "query": query,
-                "amount": amount
+                "amount": amount,
+                "resolve": resolve
             }
         }
 
-        id = self.scheduler.queue_job()
-        if self.debug:
-            print(f"Queued client request (Job ID: {str(id)})")
-
-        while not self.scheduler.ready(id):
-            if self.debug:
-                print(f"Client is busy. Waiting to start job... (Job ID: {str(id)})")
-            await asyncio.sleep(1)
-
-        self.write.write(json.dumps(payload).encode())
-
-        if self.debug:
-            print(f"Sent search request to server ({service}, {query}, {amount})...")
-
-        data = await self.read.read(65536)
-        if self.debug:
-            print(f"Received response from server")
-        
-        self.scheduler.finish_job()
+        resp = await self._request(payload, self._search_key(service, query), timeout)
         if self.debug:
-            print(f"Finished client request (Job ID: {str(id)})")
+            print(f"Received search response from server ({service}, {query}, {amount})")
 
-        resp = json.loads(data.decode())
-        output = []
         if resp["success"] is True:
             if len(resp["response"]) > 0:
-                for i in range(len(resp["response"])):
-                    output.append(Track(resp["response"][i]["source"], resp["response"][i]["id"], resp["response"][i]["title"], resp["response"][i]["artist"], resp["response"][i]["duration"], resp["response"][i]["cover"]))
-                return output
+                return Track.from_response(resp["response"], service, self)
             else:
                 raise Exception.NoResultsFound
         else:
             raise Exception.ServerRaisedError
 
-    async def get(self, url: str = None, service: str = "youtube") -> list[Track]:
+    async def search_iter(self, query: str = None, service: str = "youtube", amount: int = 10, resolve: bool = True, timeout: None | float = None):
+        '''
+        Streaming track search function.\n
+        This works like search, but is an async iterator that yields each Track as soon as the server has resolved it, so playback can start on the first result.\n
+        Tracks are yielded in the order they finish resolving, not in search result order.
+        '''
+        if query is None:
+            raise Exception.MissingQuery
+
+        if query.startswith("https://") or query.startswith("http://"):
+            async for track in self.get_iter(query, service=service, resolve=resolve, timeout=timeout):
+                yield track
+            return
+
+        payload = {
+            "service": service,
+            "operation": "search",
+            "payload": {
+                "query": query,
+                "amount": amount,
+                "resolve": resolve
+            }
+        }
+
+        async for track in self._iter_tracks(payload, self._search_key(service, query), timeout):
+            yield track
+
+    async def get(self, url: str = None, service: str = "youtube", resolve: bool = True, timeout: None | float = None) -> list[Track]:
         '''
         Main direct URL handling function.\n
         By default, this treats all URLs as YouTube URLs. URLs for a different service or file path will require providing a service manually.\n
         The search function will redirect to this function in the event you pass a URL as the query. It is recommended you call this function directly for all URLs instead of relying on the redirection.\n
-        This function will return a single Track object, however, will return a list of tracks if a playlist URL was passed.
+        This function will return a single Track object, however, will return a list of tracks if a playlist URL was passed.\n
+        Playlists are fetched page by page until the end is reached. For very long playlists, get_cursor can be used to fetch pages only as they are needed.\n
+        If resolve is False, only metadata is fetched and each Track's audio stream is resolved on demand (see Track.resolve).
         '''
         if not url:
             raise Exception.MissingURL
 
+        output, retries = [], 0
+        cursor = self.get_cursor(url, service=service, resolve=resolve, timeout=timeout)
+        while not cursor.exhausted:
+            try:
+                output.extend(await cursor.fetch())
+                retries = 0
+            except Exception.ServerOverloaded as error:
+                # Long playlists outrun the per-client rate limit partway through; the rejected page is requested again once
+                # the limit allows it, instead of discarding the pages already fetched. The cursor only advances on success
+                retries += 1
+                if retries > PAGE_RETRIES:
+                    raise
+                await asyncio.sleep(error.retry_after)
+        if len(output) > 0:
+            return output
+        raise Exception.NoResultsFound
+
+    def get_cursor(self, url: str = None, service: str = "youtube", page_size: int = 100, resolve: bool = True, timeout: None | float = None) -> PlaylistCursor:
+        '''
+        Paginated direct URL handling function.\n
+        This function returns a PlaylistCursor that fetches the tracks behind the URL one page at a time. Attach it to a Queue with Queue.attach to fetch later pages automatically as the queue drains.
+        '''
+        if not url:
+            raise Exception.MissingURL
+        return PlaylistCursor(self, url, service=service, page_size=page_size, resolve=resolve, timeout=timeout)
+
+    async def _get_page(self, url: str, service: str, offset: int, limit: int, resolve: bool, timeout: None | float = None) -> tuple[list[Track], None | int]:
         payload = {
             "service": service,
             "operation": "get",
             "payload": {
                 "url": url,
+                "resolve": resolve,
+                "offset": offset,
+                "limit": limit
             }
         }
 
-        id = self.scheduler.queue_job()
+        resp = await self._request(payload, f"{service}:get:{url}", timeout)
         if self.debug:
-            print(f"Queued client request (Job ID: {str(id)})")
+            print(f"Received get response from server ({service}, {url}, offset {offset})")
+
+        if resp["success"] is True:
+            return Track.from_response(resp["response"], service, self), resp.get("next")
+        else:
+            raise Exception.ServerRaisedError
+
+    async def get_iter(self, url: str = None, service: str = "youtube", resolve: bool = True, timeout: None | float = None):
+        '''
+        Streaming direct URL handling function.\n
+        This works like get, but is an async iterator that yields each Track as soon as the server has resolved it.\n
+        Tracks are yielded in the order they finish resolving, not in playlist order.
+        '''
+        if not url:
+            raise Exception.MissingURL
+
+        payload = {
+            "service": service,
+            "operation": "get",
+            "payload": {
+                "url": url,
+                "resolve": resolve
+            }
+        }
+
+        async for track in self._iter_tracks(payload, f"{service}:get:{url}", timeout):
+            yield track
+
+    async def resolve(self, *tracks: Track, timeout: None | float = None) -> list[Track]:
+        '''
+        Main track resolution function.\n
+        This function fetches the audio stream URLs of the given tracks in as few requests as possible, and sets them on the tracks.\n
+        Tracks that are already resolved are left untouched. With several server nodes, each track is resolved by the node that owns its ID, so repeated resolutions hit the same stream cache.
+        '''
+        # Group unresolved tracks by service and by the node that owns their ID, sending one request per group
+        groups = {}
+        for track in tracks:
+            if track.source is None:
+                key = f"{track.service}:{track.id}"
+                try:
+                    owner = self._select(key)
+                except Exception.ConnectionClosed:
+                    owner = None
+                groups.setdefault((track.service, owner), (key, []))[1].append(track)
 
-        while not self.scheduler.ready(id):
+        async def resolve_group(service: str, key: str, pending: list[Track]):
+            payload = {
+                "service": service,
+                "operation": "resolve",
+                "payload": {
+                    "ids": list(dict.fromkeys(track.id for track in pending))
+                }
+            }
+
+            resp = await self._request(payload, key, timeout)
             if self.debug:
-                print(f"Client is busy. Waiting to start job... (Job ID: {str(id)})")
-            await asyncio.sleep(1)
+                print(f"Received resolve response from server ({service}, {len(pending)} tracks)")
 
-        self.write.write(json.dumps(payload).encode())
+            if resp["success"] is not True:
+                raise Exception.ServerRaisedError
+            sources = {data["id"]: data["source"] for data in resp["response"]}
+            for track in pending:
+                track.source = sources.get(track.id)
 
-        if self.debug:
-            print(f"Sent get request to server ({service}, {url})...")
+        await asyncio.gather(*[resolve_group(service, key, pending) for (service, _), (key, pending) in groups.items()])
+        return list(tracks)
 
-        data = await self.read.read(65536)
-        if self.debug:
-            print(f"Received response from server")
-        
-        self.scheduler.finish_job()
-        if self.debug:
-            print(f"Finished client request (Job ID: {str(id)})")
+    def prefetch(self, *tracks: Track):
+        '''
+        Schedules the given tracks to be resolved in the background.\n
+        This can be called from any thread, including the audio thread that runs player callbacks. Tracks scheduled during the same event loop iteration are resolved in one batch.
+        '''
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._schedule_prefetch, tracks)
 
-        resp = json.loads(data.decode())
-        output = []
-        if resp["success"] is True:
-            if len(resp["response"]) > 0:
-                for i in range(len(resp["response"])):
-                    output.append(Track(resp["response"][i]["source"], resp["response"][i]["id"], resp["response"][i]["title"], resp["response"][i]["artist"], resp["response"][i]["duration"], resp["response"][i]["cover"]))
-                return output
-            else:
-                raise Exception.NoResultsFound
+    def _schedule_prefetch(self, tracks: tuple[Track]):
+        if not self._prefetch_batch:
+            self._loop.call_soon(self._flush_prefetch)
+        self._prefetch_batch.extend(track for track in tracks if track.source is None)
+
+    def _flush_prefetch(self):
+        batch, self._prefetch_batch = self._prefetch_batch, []
+        if batch:
+            asyncio.create_task(self._prefetch(batch))
+
+    async def _prefetch(self, batch: list[Track]):
+        try:
+            await self.resolve(*batch)
+        except (Exception.ClientException, Exception.ServerException) as error:
+            if self.debug:
+                print(f"Failed to prefetch {len(batch)} tracks: {type(error).__name__}")
+
+
+    async def stats(self, node: str = None, timeout: None | float = None) -> dict:
+        '''
+        Server statistics function.\n
+        This function returns a server's metrics: request counters, per-operation and per-stage latency percentiles, active sessions, worker use and cache statistics.\n
+        With several server nodes, pass the node's "host:port" name to choose which one is asked; otherwise the least busy node answers. See node_status for the client's view of every node.
+        '''
+        payload = {"service": "server", "operation": "stats", "payload": {}}
+        if node is None:
+            resp = await self._request(payload, timeout=timeout)
         else:
-            raise Exception.ServerRaisedError
\ No newline at end of file
+            match = [connection for connection in self.nodes if connection.name == node]
+            if not match:
+                raise ValueError(f"Unknown FlexMusic server node: {node}")
+            resp = await match[0].request(payload, self.timeout if timeout is None else timeout)
+        if resp["success"] is True:
+            return resp["response"]
+        raise Exception.ServerRaisedError
@@ -1,19 +1,59 @@
 # Import dependencies
+import asyncio
 from discord import VoiceClient, AudioSource
+from time import time
 from typing import Callable, Optional, Any
 
 # Import local dependencies
+from .exception import Exception
 from .track import Track
+from ._bufferedaudio import _BufferedAudio
 from ..util._queue import Queue
 
+# Seconds before the end of the current track at which the next track in the queue is prepared, and how many frames (of 20 milliseconds) of it are read ahead
+PREPARE_AHEAD = 10
+PREBUFFER_FRAMES = 50
+
+# Seconds a stream URL must still be valid for when its track starts; URLs closer to expiry are resolved again
+STREAM_EXPIRY_MARGIN = 300
+
+# Seconds before a track that could not be resolved for a temporary reason is tried again, doubling after every failure up to the maximum
+RETRY_DELAY = 1
+MAX_RETRY_DELAY = 30
+
 class FMPlayer(VoiceClient):
-    def __init__(self, voice_client: VoiceClient):
-        self.__class__ = type(voice_client.__class__.__name__, (self.__class__, voice_client.__class__), {})
-        self.__dict__ = voice_client.__dict__
-        self._voice_client = voice_client
+    '''
+    FlexMusic player; a VoiceClient with a track queue.\n
+    The player dispatches the FlexMusic events itself as its state changes: track_start from play, track_end when the audio source finishes or is stopped, track_pause and track_resume from pause and resume, and player_leave when the voice connection is cleaned up, however it was disconnected.\n
+    With auto_advance enabled, the player plays through its queue by itself. Shortly before a track ends, the next track in the queue is resolved again if its stream URL is about to expire, and its audio source is started and buffered, so it starts almost without a gap once the current track ends. Stopping the player then skips to the next track.
+    '''
+
+    def __new__(cls, voice_client: VoiceClient, client = None):
+        # The voice client itself becomes the player, so the overrides below also run when the Discord library calls into the voice client
+        if not isinstance(voice_client, cls):
+            voice_client.__class__ = type(voice_client.__class__.__name__, (cls, voice_client.__class__), {})
+        return voice_client
+
+    def __init__(self, voice_client: VoiceClient, client = None):
+        if "queue" in self.__dict__:
+            return
+        self._fmclient = client
+        self._left = False
+        self._prepared = None # (track, source) started ahead of time for the next track in the queue
+        self._preparing = None
+        self.auto_advance = False
         self.queue = Queue()
 
-    def play(self, track: Track | AudioSource, *, after: Callable[[Optional[Exception]], Any] = None):
+    def _dispatch(self, event: str, *args):
+        self.client.dispatch(event, *args)
+        if self._fmclient is not None and self._fmclient.debug:
+            print(f"Dispatched {event} event ({str(self.channel.id)})")
+
+    def _debug(self, message: str):
+        if self._fmclient is not None and self._fmclient.debug:
+            print(message)
+
+    def play(self, track: Track | AudioSource, *, after: Callable[[Optional[Exception]], Any] = None, **kwargs):
         """
         This is the play method for the FMPlayer class. It wraps the play method of the VoiceClient class, so it can still be used as normal.\n
         This method adds support for FlexMusic Track objects.
@@ -21,10 +61,152 @@ class FMPlayer(VoiceClient):
         if isinstance(track, Track):
             if self.queue.is_empty:
                 self.queue.add(track)
-            if after is not None:
-                return self._voice_client.play(track.src, after=after)
-            return self._voice_client.play(track.src)
+            source = self._take_prepared(track) or _BufferedAudio(track.src)
         else:
+            source = track
+
+        def finished(error: Optional[Exception]):
+            # Runs on the audio player thread once the source is exhausted, fails or is stopped
+            self.loop.call_soon_threadsafe(self._dispatch, "track_end", self)
+            if isinstance(track, Track):
+                self.loop.call_soon_threadsafe(self._advance)
             if after is not None:
-                return self._voice_client.play(track, after=after)
-            return self._voice_client.play(track)
\ No newline at end of file
+                after(error)
+
+        result = super().play(source, after=finished, **kwargs)
+        self._dispatch("track_start", self)
+        if isinstance(track, Track) and self.auto_advance:
+            if self._preparing is not None:
+                self._preparing.cancel()
+            self._preparing = self.loop.create_task(self._prepare(source, track.duration))
+        return result
+
+    #
+    # Auto-advance
+    #
+
+    async def _refresh(self, track: Track, wanted: Callable[[], bool]) -> bool:
+        # Resolves the track, again if its stream URL expires too soon to be played, and returns whether it can be played.
+        # Only failures of the track itself make it unplayable; an overloaded server, a timeout or a dropped connection is retried for as long as the track is still wanted
+        delay = RETRY_DELAY
+        while True:
+            if track.source is not None and (expires := track.expires) is not None and expires - time() < STREAM_EXPIRY_MARGIN:
+                track.source = None
+            try:
+                await track.resolve()
+            except (Exception.TrackNotResolved, Exception.ServerRaisedError) as error:
+                self._debug(f"Could not resolve track {track.id} ({str(self.channel.id)}): {type(error).__name__}")
+                return False
+            except (Exception.ClientException, Exception.ServerException) as error:
+                wait = max(delay, error.retry_after) if isinstance(error, Exception.ServerOverloaded) else delay
+                self._debug(f"Retrying track {track.id} in {wait:.1f} seconds ({str(self.channel.id)}): {type(error).__name__}")
+                await asyncio.sleep(wait)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+                if not wanted():
+                    return False
+                continue
+            return track.source is not None
+
+    async def _prepare(self, current: _BufferedAudio, duration: None | int):
+        # Waits until the current track is about to end; time spent paused is not counted, as only played frames are
+        if duration:
+            while (remaining := duration - PREPARE_AHEAD - current.elapsed) > 0:
+                await asyncio.sleep(remaining)
+        upcoming = self.queue.upcoming
+        if not upcoming:
+            return
+        track = upcoming[0]
+        if self._prepared is not None and self._prepared[0] is track:
+            return
+        self._discard_prepared()
+        if not await self._refresh(track, lambda: self._is_next(track)):
+            return
+        source = _BufferedAudio(track.src)
+        # Started in a worker thread, as reading blocks until the stream is connected
+        fill = self.loop.run_in_executor(None, source.fill, PREBUFFER_FRAMES)
+        try:
+            await asyncio.shield(fill)
+        except asyncio.CancelledError:
+            fill.add_done_callback(lambda _: source.cleanup())
+            raise
+        self._prepared = (track, source)
+
+    def _is_next(self, track: Track) -> bool:
+        upcoming = self.queue.upcoming
+        return not self._left and upcoming is not None and any(next_track is track for next_track in upcoming[:1])
+
+    def _take_prepared(self, track: Track) -> None | _BufferedAudio:
+        if self._prepared is not None and self._prepared[0] is track:
+            source, self._prepared = self._prepared[1], None
+            return source
+        self._discard_prepared()
+        return None
+
+    def _discard_prepared(self):
+        if self._prepared is not None:
+            self._prepared[1].cleanup()
+            self._prepared = None
+
+    def _advance(self):
+        # Runs on the event loop after a track ends
+        if not self.auto_advance or self._left or not self.is_connected() or self.is_playing() or self.is_paused():
+            return
+        track = self.queue.next
+        if track is None:
+            self._discard_prepared()
+            return
+        if self._prepared is not None and self._prepared[0] is track:
+            self.play(track)
+        else:
+            self.loop.create_task(self._play_next(track))
+
+    async def _play_next(self, track: Track):
+        # The next track was not prepared in time, so it is started without read-ahead. Nothing happens if another track was started meanwhile
+        wanted = lambda: self.queue.current_track is track and not self._left and self.is_connected() and not (self.is_playing() or self.is_paused())
+        playable = await self._refresh(track, wanted)
+        if not wanted():
+            return
+        if playable:
+            self.play(track)
+        else:
+            self._debug(f"Skipping track {track.id} ({str(self.channel.id)})")
+            self._advance()
+
+    def pause(self):
+        paused = self.is_paused()
+        super().pause()
+        if not paused and self.is_paused():
+            self._dispatch("track_pause", self)
+
+    def resume(self):
+        paused = self.is_paused()
+        super().resume()
+        if paused and not self.is_paused():
+            self._dispatch("track_resume", self)
+
+    async def on_voice_state_update(self, data):
+        channel_id = self.channel.id if self.channel is not None else None
+        await super().on_voice_state_update(data)
+        if self._fmclient is not None and self.channel is not None and self.channel.id != channel_id:
+            self._fmclient._move_player(self)
+
+    def cleanup(self):
+        # Called by the Discord library whenever the voice connection ends, including disconnects the bot did not ask for
+        super().cleanup()
+        if self._left:
+            return
+        self._left = True
+        if self._preparing is not None:
+            self._preparing.cancel()
+        self._discard_prepared()
+        if self._fmclient is not None:
+            self._fmclient._forget_player(self)
+        self._dispatch("player_leave", self.channel.id)
+
+    async def destroy(self):
+        '''Stops playback and disconnects the player from its voice channel'''
+        self.auto_advance = False
+        self.stop()
+        await self.disconnect(force=True)
+        if not self._left:
+            self.cleanup()
@@ -0,0 +1,69 @@
+# Import dependencies
+import asyncio
+
+# Import local dependencies
+from .exception import Exception
+from .track import Track
+
+class PlaylistCursor(object):
+    '''
+    FlexMusic PlaylistCursor object; walks a playlist on the FlexMusic server one page at a time.\n
+    Cursors are created with FMClient.get_cursor. Pages can be fetched directly with fetch, iterated with "async for", or fed into a Queue automatically with Queue.attach.
+    '''
+
+    def __init__(self, client, url: str, service: str = "youtube", page_size: int = 100, resolve: bool = True, timeout: None | float = None):
+        self._client = client
+        self.timeout = timeout
+        self.url = url
+        self.service = service
+        self.page_size = page_size
+        self.resolve = resolve
+        self.offset = 0
+        self.exhausted = False
+        self._lock = asyncio.Lock()
+        self._prefetching = False
+
+    def __repr__(self) -> str:
+        return f"<FlexMusic.PlaylistCursor url={self.url} service={self.service} offset={str(self.offset)} exhausted={str(self.exhausted)}>"
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        while not self.exhausted:
+            for track in await self.fetch():
+                yield track
+
+    async def fetch(self) -> list[Track]:
+        '''Fetches the next page of the playlist and advances the cursor. Returns an empty list once the playlist is exhausted'''
+        # Pages are fetched one at a time so concurrent callers never request the same offset twice
+        async with self._lock:
+            if self.exhausted:
+                return []
+            tracks, next_offset = await self._client._get_page(self.url, self.service, self.offset, self.page_size, self.resolve, self.timeout)
+            if next_offset is None:
+                self.exhausted = True
+            else:
+                self.offset = next_offset
+            return tracks
+
+    def prefetch_into(self, queue):
+        '''Schedules the next page to be fetched in the background and added to the given queue. Safe to call from any thread'''
+        if self.exhausted or self._client._loop is None or self._client._loop.is_closed():
+            return
+        self._client._loop.call_soon_threadsafe(self._start_prefetch, queue)
+
+    def _start_prefetch(self, queue):
+        if self.exhausted or self._prefetching:
+            return
+        self._prefetching = True
+        asyncio.create_task(self._prefetch(queue))
+
+    async def _prefetch(self, queue):
+        try:
+            queue.add(*await self.fetch())
+        except (Exception.ClientException, Exception.ServerException) as error:
+            if self._client.debug:
+                print(f"Failed to fetch the next page of {self.url}: {type(error).__name__}")
+        finally:
+            self._prefetching = False
@@ -1,31 +1,87 @@
 # Import dependencies
+import asyncio
 from discord import FFmpegPCMAudio
+from urllib.parse import parse_qs, urlsplit
+
+# Import local dependencies
+from .exception import Exception
 
 # FFMPEG options
 FFMPEG_OPTIONS = {'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5','options': '-vn'}
 
 # Track object constructor
 class Track(object):
-    '''FlexMusic Track object; contains metadata attributes and audio stream for a given track.'''
+    '''
+    FlexMusic Track object; contains metadata attributes and audio stream for a given track.\n
+    Tracks returned by a metadata-only search or get have no source until they are resolved, either with the resolve coroutine or by being prefetched from a Queue.\n
+    Two tracks are equal when they have the same service and ID, so tracks can be de-duplicated with sets and dicts. Tracks without an ID are only equal to themselves.
+    '''
+    __slots__ = ("title", "artist", "duration", "cover", "id", "source", "service", "_client", "_resolving")
 
-    def __init__(self, source: str, id: str = None, title: str = None, artist: str = None, duration: int = None, cover: str = None):
+    def __init__(self, source: str, id: str = None, title: str = None, artist: str = None, duration: int = None, cover: str = None, service: str = "youtube", client = None):
         self.title = title
         self.artist = artist
         self.duration = duration
         self.cover = cover
         self.id = id
         self.source = source
+        self.service = service
+        self._client = client
+        self._resolving = None
 
     def __repr__(self) -> str:
         return f"<FlexMusic.Track title={self.title} artist={self.artist} duration={str(self.duration)} id={self.id}>"
 
     def __eq__(self, other) -> bool:
-        if isinstance(other, Track):
-            return self.title == other.title and self.artist == other.artist and self.duration == other.duration and self.cover == other.cover and self.id == other.id and self.source == other.source
-        else:
-            return False
+        if not isinstance(other, Track):
+            return NotImplemented
+        if self.id is None or other.id is None:
+            return self is other
+        return self.id == other.id and self.service == other.service
+
+    def __hash__(self) -> int:
+        return object.__hash__(self) if self.id is None else hash((self.service, self.id))
+
+    @classmethod
+    def from_response(cls, response: list[dict], service: str = "youtube", client = None) -> list["Track"]:
+        '''Builds the Track objects for the track list of a decoded search or get response in one pass'''
+        return [cls(data.get("source"), data["id"], data["title"], data["artist"], data["duration"], data["cover"], service, client) for data in response]
+
+    @property
+    def resolved(self) -> bool:
+        '''Returns True if the audio stream URL of the track is known'''
+        return self.source is not None
+
+    @property
+    def expires(self) -> None | float:
+        '''Returns the UNIX time at which the audio stream URL of the track expires, or None if it is not known'''
+        if self.source is None:
+            return None
+        expire = parse_qs(urlsplit(self.source).query).get("expire")
+        try:
+            return float(expire[0]) if expire else None
+        except ValueError:
+            return None
+
+    async def resolve(self) -> str:
+        '''Fetches the audio stream URL of the track from the FlexMusic server if it is not known yet, and returns it'''
+        if self.source is not None:
+            return self.source
+        if self._client is None:
+            raise Exception.TrackNotResolved
+        if self._resolving is None or self._resolving.done():
+            self._resolving = asyncio.ensure_future(self._client.resolve(self))
+        await asyncio.shield(self._resolving)
+        return self.source
+
+    def prefetch(self):
+        '''Schedules the track to be resolved in the background. Safe to call from any thread'''
+        if self.source is None and self._client is not None:
+            self._client.prefetch(self)
 
     @property
     def src(self) -> FFmpegPCMAudio:
         '''Returns the PCM audio stream of the track to be played by the client.'''
-        return FFmpegPCMAudio(self.source, **FFMPEG_OPTIONS)
\ No newline at end of file
+        if self.source is None:
+            raise Exception.TrackNotResolved
+        return FFmpegPCMAudio(self.source, **FFMPEG_OPTIONS)
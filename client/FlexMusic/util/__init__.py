@@ -3,4 +3,4 @@ FlexMusic Client Utility Library\n
 This library includes utilities that can be used alongside the FlexMusic Client to make deployment easier.
 '''
 
-from ._queue import Queue
\ No newline at end of file
+from ._queue import Queue, QueueView
\ No newline at end of file
@@ -1,28 +1,148 @@
+# Import dependencies
+from collections import deque
+from itertools import islice
+from random import shuffle
+from threading import RLock
+
 # Import local dependencies
 from ..src.track import Track
 
+class QueueView(object):
+    '''
+    Read-only live view of part of a Queue.\n
+    Length, truth value and indexing read the queue directly without copying it. Iterating or slicing takes a snapshot, so the queue can keep changing while a view is being iterated.
+    '''
+    __slots__ = ("_tracks", "_lock")
+
+    def __init__(self, tracks: deque, lock: RLock):
+        self._tracks = tracks
+        self._lock = lock
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def __bool__(self) -> bool:
+        return bool(self._tracks)
+
+    def __getitem__(self, index: int | slice) -> Track | list[Track]:
+        with self._lock:
+            if isinstance(index, slice):
+                start, stop, step = index.indices(len(self._tracks))
+                return list(islice(self._tracks, start, stop, step)) if step > 0 else list(self._tracks)[index]
+            return self._tracks[index]
+
+    def __iter__(self):
+        with self._lock:
+            return iter(tuple(self._tracks))
+
+    def __repr__(self) -> str:
+        return f"<FlexMusic.QueueView length={str(len(self._tracks))}>"
+
 class Queue(object):
     '''
     FlexMusic Client Queue Handler Utility\n
-    This object is a singular queue. It can be assigned to a player and used to add a queue system to music.
+    This object is a singular queue. It can be assigned to a player and used to add a queue system to music.\n
+    The queue holds the current track, the upcoming tracks and the tracks played before, of which only the last history_size are kept (None keeps all of them). Every operation takes an internal lock, so the queue can be changed from the event loop while a player advances it from its audio thread.\n
+    The audio streams of the next "prefetch" tracks after the current one are resolved in the background as they approach the front of the queue.
     '''
+    __slots__ = ("prefetch", "_history", "_current", "_upcoming", "_lock", "_cursor", "_low_water")
+
+    def __init__(self, prefetch: int = 2, history_size: None | int = 100):
+        self.prefetch = prefetch
+        self._history = deque(maxlen=history_size)
+        self._current = None
+        self._upcoming = deque()
+        self._lock = RLock()
+        self._cursor = None
+        self._low_water = 0
 
-    def __init__(self):
-        self._queue = []
-        self._pos = 0
+    def __len__(self) -> int:
+        return self.length
+
+    def __repr__(self) -> str:
+        return f"<FlexMusic.Queue current={repr(self._current)} upcoming={str(len(self._upcoming))} history={str(len(self._history))}>"
+
+    def _prefetch(self):
+        if self._current is not None:
+            self._current.prefetch()
+        for track in islice(self._upcoming, self.prefetch):
+            track.prefetch()
+        if self._cursor is not None:
+            if self._cursor.exhausted:
+                self._cursor = None
+            elif len(self._upcoming) < self._low_water:
+                self._cursor.prefetch_into(self)
 
     #
     # Class method definition
     #
 
     def add(self, *args: Track):
-        '''Adds the provided Track object(s) to the queue'''
-        self._queue.extend(args)
+        '''Adds the provided Track object(s) to the end of the queue. If there is no current track, the first one becomes the current track'''
+        with self._lock:
+            tracks = iter(args)
+            if self._current is None:
+                self._current = next(tracks, None)
+            self._upcoming.extend(tracks)
+            self._prefetch()
+
+    def attach(self, cursor, low_water: int = 10):
+        '''
+        Attaches a PlaylistCursor to the queue.\n
+        The next page of the playlist is fetched in the background and added to the queue whenever fewer than low_water tracks are left after the current one.
+        '''
+        with self._lock:
+            self._cursor = cursor
+            self._low_water = low_water
+            self._prefetch()
 
     def empty(self):
-        '''Empty the queue and reset the position'''
-        self._queue.clear()
-        self._pos = 0
+        '''Empty the queue and its history, and detach any PlaylistCursor'''
+        with self._lock:
+            self._history.clear()
+            self._current = None
+            self._upcoming.clear()
+            self._cursor = None
+
+    def shuffle(self):
+        '''Shuffles the upcoming tracks'''
+        with self._lock:
+            # Shuffled in place, so existing views keep following the queue
+            tracks = list(self._upcoming)
+            shuffle(tracks)
+            self._upcoming.clear()
+            self._upcoming.extend(tracks)
+            self._prefetch()
+
+    def remove(self, index: int) -> Track:
+        '''Removes and returns the upcoming track at the given position (0 is the track directly after the current one). Raises IndexError if there is none'''
+        with self._lock:
+            track = self._upcoming[index]
+            del self._upcoming[index]
+            self._prefetch()
+            return track
+
+    def move(self, source: int, destination: int):
+        '''Moves the upcoming track at position source to position destination. Raises IndexError if there is no track at source'''
+        with self._lock:
+            track = self._upcoming[source]
+            del self._upcoming[source]
+            self._upcoming.insert(destination, track)
+            self._prefetch()
+
+    def jump(self, index: int) -> Track:
+        '''Skips to the upcoming track at the given position, which becomes the current track and is returned. The current and skipped tracks move to the history. Raises IndexError if there is no track at the position'''
+        with self._lock:
+            if not -len(self._upcoming) <= index < len(self._upcoming):
+                raise IndexError("queue index out of range")
+            index %= len(self._upcoming)
+            if self._current is not None:
+                self._history.append(self._current)
+            for _ in range(index):
+                self._history.append(self._upcoming.popleft())
+            self._current = self._upcoming.popleft()
+            self._prefetch()
+            return self._current
 
     #
     # Property definitions
@@ -31,41 +151,39 @@ class Queue(object):
     @property
     def is_empty(self) -> bool:
         '''Returns True if queue is empty. Returns False if queue is not empty'''
-        return not self._queue
+        return self._current is None and not self._upcoming and not self._history
 
     @property
-    def upcoming(self) -> None | list[Track]:
-        '''Returns all tracks in the queue starting at the track directly after the currently playing track. If there are no tracks in the queue after this position, or at all, this will return None'''
-        if not self._queue:
+    def upcoming(self) -> None | QueueView:
+        '''Returns a live view of all tracks in the queue starting at the track directly after the currently playing track. If the queue is empty, this will return None'''
+        if self.is_empty:
             return None
-        return self._queue[self._pos + 1:]
+        return QueueView(self._upcoming, self._lock)
 
     @property
     def current_track(self) -> None | Track:
         '''Returns the current track. If nothing is playing or the queue is empty, this will return None'''
-        if not self._queue:
-            return None
-        if self._pos <= len(self._queue) - 1:
-            return self._queue[self._pos]
+        return self._current
 
     @property
     def length(self) -> int:
-        '''Returns the integer length of the entire queue'''
-        return len(self._queue)
+        '''Returns the integer length of the entire queue, including the kept history'''
+        with self._lock:
+            return len(self._history) + (self._current is not None) + len(self._upcoming)
 
     @property
-    def history(self) -> None | list[Track]:
-        '''Returns all tracks in the queue that have already been played. If the queue is empty or nothing has been played yet, this will return None'''
-        if not self._queue:
+    def history(self) -> None | QueueView:
+        '''Returns a live view of the tracks in the queue that have already been played, oldest first, up to the history size. If the queue is empty, this will return None'''
+        if self.is_empty:
             return None
-        return self._queue[:self._pos]
+        return QueueView(self._history, self._lock)
 
     @property
     def next(self) -> None | Track:
-        '''Returns the next track in the queue and advances the queue position. If the queue is empty or there is no song after, this will not advance the queue position and return None'''
-        if not self._queue:
-            return None
-        self._pos += 1
-        if self._pos < 0 or self._pos > len(self._queue) - 1:
-            return None
-        return self._queue[self._pos]
\ No newline at end of file
+        '''Moves the current track to the history and returns the next track in the queue, which becomes the current track. If there is no track after the current one, this will return None'''
+        with self._lock:
+            if self._current is not None:
+                self._history.append(self._current)
+            self._current = self._upcoming.popleft() if self._upcoming else None
+            self._prefetch()
+            return self._current
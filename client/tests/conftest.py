@@ -0,0 +1,6 @@
+# Import dependencies
+import os
+import sys
+
+# The client library is imported as the FlexMusic package from the client directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
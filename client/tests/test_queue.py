@@ -0,0 +1,75 @@
+# Import dependencies
+import pytest
+
+# The client library needs the Discord library (py-cord) to be installed
+pytest.importorskip("discord")
+
+# Import local dependencies
+from FlexMusic.src.track import Track
+from FlexMusic.util import Queue
+
+def tracks(count: int) -> list[Track]:
+    # Tracks with a source are never prefetched, so the queue needs no client
+    return [Track(f"https://example.com/{index}", str(index)) for index in range(count)]
+
+def ids(tracks) -> list[str]:
+    return [track.id for track in tracks]
+
+def test_first_added_track_becomes_current():
+    queue = Queue()
+    queue.add(*tracks(3))
+    assert queue.current_track.id == "0"
+    assert ids(queue.upcoming) == ["1", "2"]
+    assert len(queue) == 3
+
+def test_jump_moves_current_and_skipped_tracks_to_history():
+    queue = Queue()
+    queue.add(*tracks(5))
+    assert queue.jump(2).id == "3"
+    assert ids(queue.history) == ["0", "1", "2"]
+    assert ids(queue.upcoming) == ["4"]
+    assert queue.jump(-1).id == "4"
+    assert not queue.upcoming
+
+@pytest.mark.parametrize("index", [3, -4])
+def test_jump_out_of_range_leaves_the_queue_alone(index: int):
+    queue = Queue()
+    queue.add(*tracks(4))
+    with pytest.raises(IndexError):
+        queue.jump(index)
+    assert queue.current_track.id == "0"
+    assert ids(queue.upcoming) == ["1", "2", "3"]
+
+def test_move_and_remove():
+    queue = Queue()
+    queue.add(*tracks(5))
+    queue.move(3, 0)
+    assert ids(queue.upcoming) == ["4", "1", "2", "3"]
+    queue.move(0, 10)
+    assert ids(queue.upcoming) == ["1", "2", "3", "4"]
+    assert queue.remove(1).id == "2"
+    assert ids(queue.upcoming) == ["1", "3", "4"]
+    with pytest.raises(IndexError):
+        queue.move(5, 0)
+    with pytest.raises(IndexError):
+        queue.remove(3)
+
+def test_history_keeps_only_the_last_tracks():
+    queue = Queue(history_size=2)
+    queue.add(*tracks(5))
+    while queue.next is not None:
+        pass
+    assert ids(queue.history) == ["3", "4"]
+    assert queue.current_track is None
+    assert len(queue) == 2
+
+def test_views_follow_the_queue():
+    queue = Queue()
+    queue.add(*tracks(4))
+    upcoming = queue.upcoming
+    queue.shuffle()
+    assert sorted(ids(upcoming)) == ["1", "2", "3"]
+    queue.next
+    assert len(upcoming) == 2
+    queue.empty()
+    assert queue.is_empty and queue.upcoming is None
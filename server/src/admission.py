@@ -0,0 +1,250 @@
+# Import dependencies
+from asyncio import Future, TimeoutError, get_running_loop, wait_for
+from collections import OrderedDict, deque
+from threading import local
+from time import monotonic
+
+# Import local dependencies
+from . import config
+
+# Cost units added to a waiting client's allowance every time the scheduler passes over it
+QUANTUM = 10
+
+class Overloaded(Exception):
+    '''Raised when a request is rejected by admission control'''
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def response(self) -> dict:
+        return {"success": False, "error": f"Server overloaded: {self.reason}.", "code": "overloaded", "reason": self.reason, "retry_after": round(self.retry_after, 3)}
+
+# Extractions done for the request running on each executor thread, counted by the services with record_work
+_work = local()
+
+def record_work(extractions: int = 1):
+    '''Counts extractions done for the request running on the current thread, so its client can be charged for them once it finishes'''
+    _work.extractions = getattr(_work, "extractions", 0) + extractions
+
+def collect_work() -> int:
+    '''Returns and resets the number of extractions recorded on the current thread'''
+    extractions, _work.extractions = getattr(_work, "extractions", 0), 0
+    return extractions
+
+def request_cost(request: dict) -> int:
+    '''
+    Estimates how much extraction work a request may cause, in roughly one unit per extraction, to weigh waiting requests against each other.\n
+    A metadata-only search or playlist page is a single extraction, while a resolving one extracts every returned track. Tracks served from the caches cost nothing in the end, so token buckets are charged with the work a request actually caused instead.
+    '''
+    payload = request.get("payload")
+    if not isinstance(payload, dict):
+        return 1
+    operation = request.get("operation")
+    try:
+        if operation == "search":
+            return 1 + (int(payload.get("amount", 1)) if payload.get("resolve", True) else 0)
+        if operation == "get":
+            return 1 + (int(payload.get("limit", config.PLAYLIST_PAGE_SIZE)) if payload.get("resolve", True) else 0)
+        if operation == "resolve":
+            return max(1, len(payload["ids"])) if isinstance(payload.get("ids"), list) else 1
+    except (TypeError, ValueError):
+        pass
+    return 1
+
+class _Client(object):
+    '''Admission state of one client host, shared by all of its connections'''
+
+    def __init__(self, rate: float, burst: float):
+        self.tokens = burst
+        self.refilled = monotonic()
+        self.rate, self.burst = rate, burst
+        self.inflight = 0
+        self.queued = 0 # Requests waiting for admission, across every pool
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+
+    def take(self) -> float:
+        '''Charges the token bucket one unit for a new request. Returns 0 when the request may proceed, or the seconds until it could'''
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def charge(self, extractions: int):
+        # The bucket may go into debt, by at most a full bucket, which holds back the client's next requests until it refills
+        self._refill()
+        self.tokens = max(-self.burst, self.tokens - extractions)
+
+class _Waiting(object):
+    '''Requests of one client waiting in one pool, with the client's deficit round-robin allowance there'''
+
+    __slots__ = ("client", "deficit", "entries")
+
+    def __init__(self, client: _Client):
+        self.client = client
+        self.deficit = 0
+        self.entries: deque[tuple[Future, int]] = deque()
+
+class _Pool(object):
+    '''Admission slots of one service; requests of different pools never wait for each other'''
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.active = 0
+        self.queued = 0
+        self.ready: OrderedDict[str, _Waiting] = OrderedDict() # Clients with waiting requests, in round-robin order
+
+    def stats(self) -> dict:
+        return {"active": self.active, "queued": self.queued, "capacity": self.capacity}
+
+class AdmissionController(object):
+    '''
+    Decides when requests may start running, across every connection to the server.\n
+    Every service has its own pool of admission slots, added with add_pool, so a slow service that holds all of its slots never delays the requests of another; requests outside any service use a default pool of capacity slots. Each client host is limited to a number of requests in flight and to a token-bucket rate of work, charged one unit per request when it is admitted and one unit per extraction it actually caused once it finishes, so requests served from the caches stay cheap. When a pool is full, its waiting requests are started in deficit round-robin order across clients, weighted by their estimated cost, so one client's playlist floods cannot delay another client's single searches. Requests that would exceed a limit or wait too long are rejected immediately with Overloaded.\n
+    Only used from the event loop thread.
+    '''
+
+    def __init__(self, capacity: int = config.MAX_ACTIVE_REQUESTS, queue_size: int = config.ADMISSION_QUEUE_SIZE, queue_timeout: float = config.ADMISSION_QUEUE_TIMEOUT, client_inflight: int = config.CLIENT_MAX_INFLIGHT, client_rate: float = config.CLIENT_RATE, client_burst: float = config.CLIENT_BURST):
+        self.queue_size, self.queue_timeout = queue_size, queue_timeout
+        self.client_inflight, self.client_rate, self.client_burst = client_inflight, client_rate, client_burst
+        self._clients: dict[str, _Client] = {}
+        self._pools: dict[None | str, _Pool] = {None: _Pool(capacity)}
+        self._prune_at = 1024
+        self.queued = 0
+        self.admitted = 0
+        self.rejected: dict[str, int] = {}
+
+    def add_pool(self, name: str, capacity: int):
+        '''Gives the requests admitted under the pool name their own capacity slots'''
+        if name in self._pools:
+            raise ValueError(f"Admission pool {name} already exists")
+        self._pools[name] = _Pool(capacity)
+
+    @property
+    def active(self) -> int:
+        return sum(pool.active for pool in self._pools.values())
+
+    def _client(self, key: str) -> _Client:
+        if (client := self._clients.get(key)) is None:
+            if len(self._clients) >= self._prune_at:
+                self._prune()
+            self._clients[key] = client = _Client(self.client_rate, self.client_burst)
+        return client
+
+    def _prune(self):
+        # Forgets idle clients whose token bucket has refilled, as they are indistinguishable from new ones
+        now = monotonic()
+        for key, client in list(self._clients.items()):
+            if client.inflight == 0 and client.queued == 0 and client.tokens + (now - client.refilled) * client.rate >= client.burst:
+                del self._clients[key]
+        self._prune_at = max(1024, len(self._clients) * 2)
+
+    def _reject(self, reason: str, retry_after: float) -> Overloaded:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return Overloaded(reason, retry_after)
+
+    async def admit(self, key: str, cost: int, pool: str = None):
+        '''Waits until a request from the client key, weighted by its estimated cost, may run in the given pool. Raises Overloaded if it is rejected. Every successful call must be paired with release'''
+        client = self._client(key)
+        slots = self._pools[pool]
+        if client.inflight + client.queued >= self.client_inflight:
+            raise self._reject("too many requests in flight", 0.1)
+        if (wait := client.take()) > 0:
+            raise self._reject("rate limit exceeded", wait)
+        if slots.active < slots.capacity and not slots.ready:
+            self._start(client, slots)
+            return
+        if self.queued >= self.queue_size:
+            raise self._reject("queue full", self.queue_timeout)
+        future = get_running_loop().create_future()
+        entry = (future, cost)
+        if (waiting := slots.ready.get(key)) is None:
+            slots.ready[key] = waiting = _Waiting(client)
+        waiting.entries.append(entry)
+        client.queued += 1
+        slots.queued += 1
+        self.queued += 1
+        try:
+            await wait_for(future, self.queue_timeout)
+        except TimeoutError:
+            self._withdraw(key, slots, entry)
+            raise self._reject("queue timeout", self.queue_timeout)
+        except BaseException:
+            # Cancelled while waiting; if the slot was already granted, hand it back
+            if future.done() and not future.cancelled():
+                self.release(key, pool)
+            else:
+                self._withdraw(key, slots, entry)
+            raise
+
+    def _unqueue(self, key: str, slots: _Pool, waiting: _Waiting):
+        waiting.client.queued -= 1
+        slots.queued -= 1
+        self.queued -= 1
+        if not waiting.entries:
+            # The allowance is only kept while the client has requests waiting
+            slots.ready.pop(key)
+
+    def _withdraw(self, key: str, slots: _Pool, entry: tuple):
+        if (waiting := slots.ready.get(key)) is None:
+            return
+        try:
+            waiting.entries.remove(entry)
+        except ValueError:
+            return
+        self._unqueue(key, slots, waiting)
+
+    def _start(self, client: _Client, slots: _Pool):
+        client.inflight += 1
+        slots.active += 1
+        self.admitted += 1
+
+    def charge(self, key: str, extractions: int):
+        '''Charges the client key for the extractions a finished request caused. Must be called before the request is released'''
+        if extractions > 0:
+            self._clients[key].charge(extractions)
+
+    def release(self, key: str, pool: str = None):
+        '''Marks a request from the client key in the given pool as finished and starts the next requests waiting there'''
+        client = self._clients[key]
+        client.inflight -= 1
+        slots = self._pools[pool]
+        slots.active -= 1
+        self._dispatch(slots)
+
+    def _dispatch(self, slots: _Pool):
+        # Deficit round-robin: each pass tops up a client's allowance by QUANTUM, and its oldest request starts once the allowance covers its cost
+        while slots.active < slots.capacity and slots.ready:
+            key, waiting = next(iter(slots.ready.items()))
+            future, cost = waiting.entries[0]
+            if future.done():
+                # Timed out or cancelled, but its waiter has not yet withdrawn it
+                waiting.entries.popleft()
+                self._unqueue(key, slots, waiting)
+                continue
+            if waiting.deficit < cost:
+                waiting.deficit += QUANTUM
+                slots.ready.move_to_end(key)
+                continue
+            waiting.deficit -= cost
+            waiting.entries.popleft()
+            self._unqueue(key, slots, waiting)
+            self._start(waiting.client, slots)
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "capacity": sum(pool.capacity for pool in self._pools.values()),
+            "pools": {name or "default": pool.stats() for name, pool in self._pools.items()},
+            "clients": len(self._clients),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected)
+        }
@@ -0,0 +1,124 @@
+# Import dependencies
+from collections import OrderedDict
+from threading import Lock
+from time import time
+from urllib.parse import urlsplit, parse_qs
+from unicodedata import normalize
+
+class LRUCache(object):
+    '''
+    Thread-safe least-recently-used cache with a per-entry expiry time and a total size budget.\n
+    Each entry is stored with a size in arbitrary units; once the sum of all sizes exceeds max_size, the least recently used entries are evicted.
+    '''
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict() # key -> (expires_at, size, value)
+        self._size = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[0] <= time():
+                self._discard(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, value, ttl: float, size: int = 1):
+        if ttl <= 0 or size > self.max_size:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time() + ttl, size, value)
+            self._size += size
+            while self._size > self.max_size:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "size": self._size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+class StreamCache(LRUCache):
+    '''
+    Cache of resolved audio stream URLs keyed by video ID.\n
+    Entries expire a safety margin before the "expire" timestamp embedded in the stream URL, and the size budget is measured in bytes.
+    '''
+
+    # Approximate per-entry overhead of the key, tuple and dictionary slot, in bytes
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_bytes: int, expiry_margin: float, default_ttl: float):
+        LRUCache.__init__(self, max_bytes)
+        self.expiry_margin = expiry_margin
+        self.default_ttl = default_ttl
+
+    def ttl_for(self, url: str) -> float:
+        '''Returns how long the stream URL can be cached for, based on its "expire" query parameter'''
+        expire = parse_qs(urlsplit(url).query).get("expire")
+        if not expire:
+            return self.default_ttl
+        try:
+            return float(expire[0]) - time() - self.expiry_margin
+        except ValueError:
+            return self.default_ttl
+
+    def put_source(self, id: str, url: str, ttl: None | float = None):
+        self.put(id, url, self.ttl_for(url) if ttl is None else ttl, len(id) + len(url) + self.ENTRY_OVERHEAD)
+
+class SearchCache(LRUCache):
+    '''
+    Cache of search result metadata keyed by service and normalized query.\n
+    A cached search for N results also answers any later search for N or fewer results. The size budget is measured in entries.
+    '''
+
+    def __init__(self, max_entries: int, ttl: float):
+        LRUCache.__init__(self, max_entries)
+        self.ttl = ttl
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        '''Folds case, compatibility characters and whitespace so equivalent queries share one cache entry'''
+        return " ".join(normalize("NFKC", query).casefold().split())
+
+    def get_results(self, service: str, query: str, amount: int) -> None | list[dict]:
+        entry = self.get((service, self.normalize(query)))
+        # An entry that returned fewer results than it asked for is exhaustive and answers any amount
+        if entry is None or (entry[0] < amount and len(entry[1]) >= entry[0]):
+            return None
+        return [dict(data) for data in entry[1][:amount]]
+
+    def put_results(self, service: str, query: str, amount: int, results: list[dict], ttl: None | float = None):
+        self.put((service, self.normalize(query)), (amount, [dict(data) for data in results]), self.ttl if ttl is None else ttl)
@@ -0,0 +1,64 @@
+# Import dependencies
+from concurrent.futures import Future
+from threading import Lock
+from typing import Any, Callable, Hashable
+
+class SingleFlight(object):
+    '''
+    Thread-safe request coalescer.\n
+    Only one call per key runs at a time. Callers that ask for a key that is already in flight wait for that call and share its result instead of starting their own.
+    '''
+
+    def __init__(self):
+        self._calls: dict[Hashable, Future] = {}
+        self._lock = Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    def claim(self, key: Hashable) -> tuple[Future, bool]:
+        '''
+        Registers interest in a key. Returns the future holding its result, and whether the caller is the leader.\n
+        The leader must complete the key with resolve or fail; every other caller only waits on the future.
+        '''
+        with self._lock:
+            if (future := self._calls.get(key)) is not None:
+                self.coalesced += 1
+                return future, False
+            self._calls[key] = future = Future()
+            self.executed += 1
+            return future, True
+
+    def resolve(self, key: Hashable, result: Any):
+        with self._lock:
+            future = self._calls.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    def fail(self, key: Hashable, error: BaseException) -> bool:
+        '''Completes the key with an error. Returns False if the key was not in flight'''
+        with self._lock:
+            future = self._calls.pop(key, None)
+        if future is None or future.done():
+            return False
+        future.set_exception(error)
+        return True
+
+    def do(self, key: Hashable, func: Callable, *args) -> Any:
+        '''Calls func(*args) unless a call for the same key is already in flight, in which case its result is returned instead'''
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result()
+        try:
+            result = func(*args)
+        except BaseException as error:
+            self.fail(key, error)
+            raise
+        self.resolve(key, result)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "coalesced": self.coalesced
+        }
@@ -0,0 +1,105 @@
+# Import dependencies
+from os import environ
+
+# Server configuration. Every value can be overridden with the matching FLEXMUSIC_* environment variable.
+
+# Address and port the server listens on
+HOST = environ.get("FLEXMUSIC_HOST", "0.0.0.0")
+PORT = int(environ.get("FLEXMUSIC_PORT", 5000))
+
+# Length of the kernel accept queue for pending connections
+BACKLOG = int(environ.get("FLEXMUSIC_BACKLOG", 1024))
+
+# Number of threads that run requests not handled by a service, such as server statistics
+EXECUTOR_WORKERS = int(environ.get("FLEXMUSIC_EXECUTOR_WORKERS", 4))
+
+# Number of threads that run the requests of each service, the maximum number of its requests that run at once (further requests wait in
+# the service's own fair queue), and the maximum number of its requests running or waiting for admission at once
+YOUTUBE_WORKERS = int(environ.get("FLEXMUSIC_YOUTUBE_WORKERS", 32))
+YOUTUBE_MAX_ACTIVE = int(environ.get("FLEXMUSIC_YOUTUBE_MAX_ACTIVE", 64))
+YOUTUBE_MAX_INFLIGHT = int(environ.get("FLEXMUSIC_YOUTUBE_MAX_INFLIGHT", 512))
+HTTP_WORKERS = int(environ.get("FLEXMUSIC_HTTP_WORKERS", 4))
+HTTP_MAX_ACTIVE = int(environ.get("FLEXMUSIC_HTTP_MAX_ACTIVE", 16))
+HTTP_MAX_INFLIGHT = int(environ.get("FLEXMUSIC_HTTP_MAX_INFLIGHT", 64))
+
+# Maximum number of requests from a single connection that are processed at the same time
+MAX_CONCURRENT_REQUESTS = int(environ.get("FLEXMUSIC_MAX_CONCURRENT_REQUESTS", 8))
+
+# Maximum number of requests from a single connection waiting for one of its processing slots; further requests are rejected as overloaded
+MAX_PENDING_REQUESTS = int(environ.get("FLEXMUSIC_MAX_PENDING_REQUESTS", 256))
+
+# Maximum number of requests for no registered service, across all connections, that run at once; further requests wait in a fair queue
+MAX_ACTIVE_REQUESTS = int(environ.get("FLEXMUSIC_MAX_ACTIVE_REQUESTS", 64))
+
+# Maximum number of requests waiting for admission, and how long in seconds each may wait, before requests are rejected as overloaded
+ADMISSION_QUEUE_SIZE = int(environ.get("FLEXMUSIC_ADMISSION_QUEUE_SIZE", 1024))
+ADMISSION_QUEUE_TIMEOUT = float(environ.get("FLEXMUSIC_ADMISSION_QUEUE_TIMEOUT", 10))
+
+# Maximum number of requests in flight from one client host, across all of its connections
+CLIENT_MAX_INFLIGHT = int(environ.get("FLEXMUSIC_CLIENT_MAX_INFLIGHT", 32))
+
+# Sustained and burst rate of work each client host may request, in cost units (roughly one per extraction) per second
+CLIENT_RATE = float(environ.get("FLEXMUSIC_CLIENT_RATE", 20))
+CLIENT_BURST = float(environ.get("FLEXMUSIC_CLIENT_BURST", 200))
+
+# Number of long-lived processes that resolve audio streams, started and warmed up once when the server starts
+EXTRACTION_WORKERS = int(environ.get("FLEXMUSIC_EXTRACTION_WORKERS", 8))
+
+# Memory budget of the resolved stream URL cache, in bytes
+STREAM_CACHE_BYTES = int(environ.get("FLEXMUSIC_STREAM_CACHE_BYTES", 32 * 1024 * 1024))
+
+# Seconds before a stream URL's own expiry time at which its cache entry is dropped
+STREAM_CACHE_EXPIRY_MARGIN = int(environ.get("FLEXMUSIC_STREAM_CACHE_EXPIRY_MARGIN", 600))
+
+# Lifetime of cached stream URLs that carry no expiry time, in seconds
+STREAM_CACHE_DEFAULT_TTL = int(environ.get("FLEXMUSIC_STREAM_CACHE_DEFAULT_TTL", 1800))
+
+# Maximum number of distinct queries held in the search result cache
+SEARCH_CACHE_ENTRIES = int(environ.get("FLEXMUSIC_SEARCH_CACHE_ENTRIES", 4096))
+
+# Lifetime of cached search results, in seconds
+SEARCH_CACHE_TTL = int(environ.get("FLEXMUSIC_SEARCH_CACHE_TTL", 3600))
+
+# Path of the SQLite file that keeps cached stream URLs and search results across restarts; empty disables it
+PERSIST_PATH = environ.get("FLEXMUSIC_PERSIST_PATH", "")
+
+# Maximum number of stream URLs and of searches kept in the persistent cache file
+PERSIST_MAX_STREAMS = int(environ.get("FLEXMUSIC_PERSIST_MAX_STREAMS", 100000))
+PERSIST_MAX_SEARCHES = int(environ.get("FLEXMUSIC_PERSIST_MAX_SEARCHES", 20000))
+
+# Maximum number of cache entries waiting for the persistent cache writer before new ones are dropped
+PERSIST_QUEUE_SIZE = int(environ.get("FLEXMUSIC_PERSIST_QUEUE_SIZE", 10000))
+
+# Maximum number of playlist entries returned by a single get request; longer playlists are paged
+PLAYLIST_PAGE_SIZE = int(environ.get("FLEXMUSIC_PLAYLIST_PAGE_SIZE", 100))
+
+# Minimum size, in bytes, of a response body before it is compressed for clients that negotiated compression
+COMPRESSION_THRESHOLD = int(environ.get("FLEXMUSIC_COMPRESSION_THRESHOLD", 16384))
+
+# Address and port of the plain-text metrics endpoint (GET /metrics); a port of 0 disables it
+METRICS_HOST = environ.get("FLEXMUSIC_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(environ.get("FLEXMUSIC_METRICS_PORT", 0))
+
+# Minimum level of log records written (DEBUG, INFO, WARNING, ERROR); per-request records are written at DEBUG
+LOG_LEVEL = environ.get("FLEXMUSIC_LOG_LEVEL", "INFO")
+
+# Log line format: "text" for the console, or "json" for one JSON object per line
+LOG_FORMAT = environ.get("FLEXMUSIC_LOG_FORMAT", "text")
+
+# Maximum number of per-request log records written per second; the rest are dropped and counted
+LOG_REQUEST_RATE = float(environ.get("FLEXMUSIC_LOG_REQUEST_RATE", 50))
+
+# Maximum number of log records waiting for the background writer before new records are dropped
+LOG_QUEUE_SIZE = int(environ.get("FLEXMUSIC_LOG_QUEUE_SIZE", 10000))
+
+# Extraction backend: "yt_dlp" for YouTube, or "fake" for the deterministic offline stand-in used by the benchmark suite
+EXTRACTOR = environ.get("FLEXMUSIC_EXTRACTOR", "yt_dlp")
+
+# Behaviour of the fake extraction backend: mean latency per extraction in seconds, latency jitter as a fraction of the mean,
+# stream URL size in bytes, share of extractions that fail, entries per playlist, and the seed of all generated data
+FAKE_LATENCY = float(environ.get("FLEXMUSIC_FAKE_LATENCY", 0.2))
+FAKE_JITTER = float(environ.get("FLEXMUSIC_FAKE_JITTER", 0.25))
+FAKE_PAYLOAD_SIZE = int(environ.get("FLEXMUSIC_FAKE_PAYLOAD_SIZE", 1000))
+FAKE_FAILURE_RATE = float(environ.get("FLEXMUSIC_FAKE_FAILURE_RATE", 0.0))
+FAKE_PLAYLIST_SIZE = int(environ.get("FLEXMUSIC_FAKE_PLAYLIST_SIZE", 300))
+FAKE_SEED = environ.get("FLEXMUSIC_FAKE_SEED", "flexmusic")
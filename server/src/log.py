@@ -0,0 +1,150 @@
+# Import dependencies
+import logging
+from datetime import datetime
+from json import dumps
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue, Full
+from sys import stdout
+from threading import Lock
+from time import monotonic
+
+# Import local dependencies
+from . import config
+
+class StructuredLogger(object):
+    '''
+    Thin wrapper around a standard library logger that attaches keyword fields to every record.\n
+    Level checks happen before any record or field formatting, so calls for disabled levels cost almost nothing.
+    '''
+
+    __slots__ = ("_logger",)
+
+    def __init__(self, logger: logging.Logger):
+        self._logger = logger
+
+    def enabled(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+    def log(self, level: int, event: str, exc_info = None, **fields):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event: str, **fields):
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(event, extra={"fields": fields})
+
+    def info(self, event: str, **fields):
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info(event, extra={"fields": fields})
+
+    def warning(self, event: str, **fields):
+        if self._logger.isEnabledFor(logging.WARNING):
+            self._logger.warning(event, extra={"fields": fields})
+
+    def error(self, event: str, exc_info = None, **fields):
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._logger.error(event, exc_info=exc_info, extra={"fields": fields})
+
+class RateLimitFilter(logging.Filter):
+    '''
+    Token bucket filter for high-volume per-request records.\n
+    At most rate records per second pass (with bursts of up to rate records). The number of records dropped since the last one that passed is attached to it as the "suppressed" field.
+    '''
+
+    def __init__(self, rate: float):
+        logging.Filter.__init__(self)
+        self.rate = rate
+        self._tokens = rate
+        self._last = monotonic()
+        self._suppressed = 0
+        self._lock = Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens < 1:
+                self._suppressed += 1
+                return False
+            self._tokens -= 1
+            if self._suppressed:
+                record.fields = dict(getattr(record, "fields", {}), suppressed=self._suppressed)
+                self._suppressed = 0
+        return True
+
+class _DroppingQueueHandler(QueueHandler):
+    # Never blocks the calling thread: when the writer falls behind and the queue is full, records are dropped and counted
+    def __init__(self, queue: Queue):
+        QueueHandler.__init__(self, queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting is left to the background writer; only exception text is rendered here, while the traceback is still alive
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class TextFormatter(logging.Formatter):
+    '''Formats records as " [Sun Jan 01 12:00:00] LEVEL Event key=value ..." in the style of the server's console output'''
+
+    def format(self, record: logging.LogRecord) -> str:
+        timestamp = datetime.fromtimestamp(record.created).strftime("%a %b %d %H:%M:%S")
+        fields = "".join(f" {key}={value}" for key, value in getattr(record, "fields", {}).items())
+        line = f" [{timestamp}] {record.levelname:<7} {record.getMessage()}{fields}"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+class JSONFormatter(logging.Formatter):
+    '''Formats records as one JSON object per line, for log collectors'''
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {"time": record.created, "level": record.levelname, "logger": record.name, "event": record.getMessage()}
+        data.update(getattr(record, "fields", {}))
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return dumps(data, default=str)
+
+_listener: None | QueueListener = None
+_handler: None | _DroppingQueueHandler = None
+
+def get_logger(name: str = "flexmusic") -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(name))
+
+# Logger for records written once or more per request; these are rate limited
+request_log = get_logger("flexmusic.request")
+
+def start_logging(level: str = config.LOG_LEVEL, format: str = config.LOG_FORMAT, request_rate: float = config.LOG_REQUEST_RATE, queue_size: int = config.LOG_QUEUE_SIZE):
+    '''Routes every FlexMusic record through a bounded queue to a background thread that writes it to stdout'''
+    global _listener, _handler
+    if _listener is not None:
+        return
+    root = logging.getLogger("flexmusic")
+    root.setLevel(level.upper())
+    root.propagate = False
+    logging.getLogger("flexmusic.request").addFilter(RateLimitFilter(request_rate))
+    queue = Queue(queue_size)
+    _handler = _DroppingQueueHandler(queue)
+    root.addHandler(_handler)
+    writer = logging.StreamHandler(stdout)
+    writer.setFormatter(JSONFormatter() if format == "json" else TextFormatter())
+    _listener = QueueListener(queue, writer)
+    _listener.start()
+
+def stop_logging():
+    '''Flushes every queued record and stops the background writer'''
+    global _listener
+    if _listener is None:
+        return
+    if _handler.dropped:
+        logging.getLogger("flexmusic").warning("Log records were dropped because the writer fell behind", extra={"fields": {"dropped": _handler.dropped}})
+    _listener.stop()
+    _listener = None
@@ -0,0 +1,144 @@
+# Import dependencies
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+from typing import Callable
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram(object):
+    '''Fixed-bucket latency histogram. Not thread-safe on its own; Metrics serializes access to it'''
+
+    def __init__(self, buckets: tuple[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        '''Estimates the q-quantile as the upper bound of the bucket it falls in'''
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99)
+        }
+
+class Metrics(object):
+    '''
+    Server-wide metrics registry holding counters, gauges and latency histograms.\n
+    Every series is identified by a name and a set of labels, such as the operation or the request stage. Gauges can also be registered as callables that are read when a snapshot is taken, and collectors can expose whole dictionaries of statistics (such as cache counters).
+    '''
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters: dict[tuple, float] = {}
+        self._gauges: dict[tuple, float] = {}
+        self._histograms: dict[tuple, Histogram] = {}
+        self._gauge_functions: dict[str, Callable[[], float]] = {}
+        self._collectors: dict[str, Callable[[], dict]] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted(labels.items())))
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def adjust(self, name: str, amount: float, **labels):
+        '''Moves a gauge up or down by the given amount'''
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if (histogram := self._histograms.get(key)) is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        '''Observes the time spent inside the with block'''
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start, **labels)
+
+    def register_gauge(self, name: str, function: Callable[[], float]):
+        self._gauge_functions[name] = function
+
+    def register_collector(self, name: str, function: Callable[[], dict]):
+        self._collectors[name] = function
+
+    def snapshot(self) -> dict:
+        '''Returns every series as plain JSON-compatible data'''
+        def label(key: tuple) -> str:
+            return key[0] + "".join(f"[{value}]" for _, value in key[1])
+        with self._lock:
+            output = {
+                "counters": {label(key): value for key, value in self._counters.items()},
+                "gauges": {label(key): value for key, value in self._gauges.items()},
+                "latency": {label(key): histogram.snapshot() for key, histogram in self._histograms.items()}
+            }
+        for name, function in self._gauge_functions.items():
+            output["gauges"][name] = function()
+        for name, function in self._collectors.items():
+            output[name] = function()
+        return output
+
+    def render(self) -> str:
+        '''Returns every series in the Prometheus text exposition format'''
+        def labels(pairs: tuple, extra: str = "") -> str:
+            items = [f'{key}="{value}"' for key, value in pairs] + ([extra] if extra else [])
+            return "{" + ",".join(items) + "}" if items else ""
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: (histogram.buckets, list(histogram.counts), histogram.count, histogram.sum) for key, histogram in self._histograms.items()}
+        for (name, pairs), value in sorted(counters.items()):
+            lines.append(f"flexmusic_{name}_total{labels(pairs)} {value}")
+        for (name, pairs), value in sorted(gauges.items()):
+            lines.append(f"flexmusic_{name}{labels(pairs)} {value}")
+        for name, function in sorted(self._gauge_functions.items()):
+            lines.append(f"flexmusic_{name} {function()}")
+        for collector, function in sorted(self._collectors.items()):
+            for name, value in function().items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"flexmusic_{collector}_{name} {value}")
+        for (name, pairs), (buckets, counts, count, total) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"flexmusic_{name}_seconds_bucket{labels(pairs, le)} {cumulative}")
+            lines.append(f"flexmusic_{name}_seconds_count{labels(pairs)} {count}")
+            lines.append(f"flexmusic_{name}_seconds_sum{labels(pairs)} {total}")
+        return "\n".join(lines) + "\n"
+
+# Registry shared by the whole server
+metrics = Metrics()
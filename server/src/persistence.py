@@ -0,0 +1,144 @@
+# Import dependencies
+import sqlite3
+from json import dumps, loads
+from queue import Queue, Empty, Full
+from threading import Thread
+from time import time, perf_counter
+
+# Import local dependencies
+from .cache import StreamCache, SearchCache
+from .log import get_logger
+from . import config
+
+# Maximum number of queued writes committed in one transaction, and the number of writes after which old and expired rows are pruned
+BATCH_SIZE = 500
+PRUNE_INTERVAL = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS streams (id TEXT PRIMARY KEY, url TEXT NOT NULL, expires REAL NOT NULL, updated REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS streams_updated ON streams (updated);
+CREATE TABLE IF NOT EXISTS searches (service TEXT NOT NULL, query TEXT NOT NULL, amount INTEGER NOT NULL, results TEXT NOT NULL, expires REAL NOT NULL, updated REAL NOT NULL, PRIMARY KEY (service, query));
+CREATE INDEX IF NOT EXISTS searches_updated ON searches (updated);
+"""
+
+log = get_logger("flexmusic.persistence")
+
+class CacheStore(object):
+    '''
+    SQLite file that keeps the stream URL and search result caches across server restarts.\n
+    Unexpired entries are loaded into the in-memory caches when the server starts. Afterwards, every entry put into a cache is also handed to a background writer thread through a bounded queue, so requests never wait on the disk; writes are dropped and counted when the writer falls behind. The file holds at most max_streams stream URLs and max_searches searches, the least recently written ones being pruned first.
+    '''
+
+    def __init__(self, path: str = config.PERSIST_PATH, max_streams: int = config.PERSIST_MAX_STREAMS, max_searches: int = config.PERSIST_MAX_SEARCHES, queue_size: int = config.PERSIST_QUEUE_SIZE):
+        self.path = path
+        self.max_streams, self.max_searches = max_streams, max_searches
+        self.loaded = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._queue = Queue(queue_size)
+        connection = self._connect()
+        try:
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+        self._writer = Thread(target=self._run, name="flexmusic-persistence", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        # Incremental vacuuming only takes effect on a new file, and lets pruned pages be returned to the file system
+        connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
+
+    def load(self, stream_cache: StreamCache, search_cache: SearchCache):
+        '''Fills the caches with every unexpired entry in the file, oldest first so the newest entries end up most recently used'''
+        st = perf_counter()
+        now = time()
+        streams = searches = 0
+        connection = self._connect()
+        try:
+            for id, url, expires in connection.execute("SELECT id, url, expires FROM streams WHERE expires > ? ORDER BY updated", (now,)):
+                stream_cache.put_source(id, url, expires - now)
+                streams += 1
+            for service, query, amount, results, expires in connection.execute("SELECT service, query, amount, results, expires FROM searches WHERE expires > ? ORDER BY updated", (now,)):
+                search_cache.put_results(service, query, amount, loads(results), expires - now)
+                searches += 1
+        finally:
+            connection.close()
+        self.loaded = streams + searches
+        log.info("Loaded persistent cache", path=self.path, streams=streams, searches=searches, seconds=round(perf_counter() - st, 3))
+
+    def _enqueue(self, item: tuple):
+        try:
+            self._queue.put_nowait(item)
+        except Full:
+            self.dropped += 1
+
+    def put_stream(self, id: str, url: str, ttl: float):
+        if ttl > 0:
+            now = time()
+            self._enqueue(("streams", (id, url, now + ttl, now)))
+
+    def put_search(self, service: str, query: str, amount: int, results: list[dict], ttl: float):
+        if ttl > 0:
+            now = time()
+            self._enqueue(("searches", (service, SearchCache.normalize(query), amount, dumps(results), now + ttl, now)))
+
+    def _run(self):
+        connection = self._connect()
+        pending = 0
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while batch[-1] is not None and len(batch) < BATCH_SIZE:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except Empty:
+                        break
+                stop = batch[-1] is None
+                streams = [row for table, row in batch[:-1 if stop else None] if table == "streams"]
+                searches = [row for table, row in batch[:-1 if stop else None] if table == "searches"]
+                try:
+                    with connection:
+                        connection.executemany("INSERT OR REPLACE INTO streams VALUES (?, ?, ?, ?)", streams)
+                        connection.executemany("INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?, ?)", searches)
+                    self.written += len(streams) + len(searches)
+                    pending += len(streams) + len(searches)
+                    if pending >= PRUNE_INTERVAL or stop:
+                        self._prune(connection)
+                        pending = 0
+                except sqlite3.Error as error:
+                    self.errors += 1
+                    log.error("Failed to write to the persistent cache", error=str(error))
+                if stop:
+                    return
+        finally:
+            connection.close()
+
+    def _prune(self, connection: sqlite3.Connection):
+        now = time()
+        with connection:
+            for table, limit in (("streams", self.max_streams), ("searches", self.max_searches)):
+                connection.execute(f"DELETE FROM {table} WHERE expires <= ?", (now,))
+                connection.execute(f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} ORDER BY updated DESC LIMIT -1 OFFSET ?)", (limit,))
+        # The pragma frees one page per step, and execute steps a statement without result columns only once, so it is run as a script to free the whole freelist
+        connection.executescript("PRAGMA incremental_vacuum;")
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "written": self.written,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "errors": self.errors
+        }
+
+    def close(self):
+        '''Writes every queued entry, prunes the file and stops the writer thread'''
+        self._queue.put(None)
+        self._writer.join()
+        if self.dropped:
+            log.warning("Persistent cache writes were dropped because the writer fell behind", dropped=self.dropped)
@@ -1,39 +1,175 @@
 # Import dependencies
-from json import JSONDecodeError, loads, dumps
-from threading import Thread
-from socket import socket
+from asyncio import StreamReader, StreamWriter, Semaphore, Queue, Task, CancelledError, create_task, get_running_loop
+from concurrent.futures import Executor
+from time import perf_counter
 
 # Import local dependencies
-from ..util import logTime
+from ..log import get_logger, request_log
+from .. import config
+from ..metrics import metrics
+from ..admission import AdmissionController, Overloaded, request_cost, collect_work
 from .client_router import ClientRouter
+from .framing import Codec, FrameError, recv_frame, send_frame, handshake
 
-class ClientHandler(Thread):
-    def __init__(self, sock: socket, addr: tuple[str, int], session_manager):
-        Thread.__init__(self)
-        self.daemon = True
-        self.addr, self.sock, self.session_manager = addr, sock, session_manager
-        self.router = ClientRouter()
-        print(logTime() + f"Connection established with {addr[0]}:{addr[1]} successfully")
+log = get_logger("flexmusic.session")
 
-    def run(self):
+class ClientHandler(object):
+    def __init__(self, reader: StreamReader, writer: StreamWriter, session_manager, router: ClientRouter, executor: Executor, admission: AdmissionController):
+        self.reader, self.writer, self.session_manager = reader, writer, session_manager
+        self.addr = writer.get_extra_info("peername")[:2]
+        self.router, self.executor, self.admission = router, executor, admission
+        self._slots = Semaphore(config.MAX_CONCURRENT_REQUESTS)
+        self._tasks: set[Task] = set()
+        self._closed = False
+        self.codec: Codec = None
+        self.peer = f"{self.addr[0]}:{self.addr[1]}"
+        log.info("Connection established", peer=self.peer)
+
+    async def run(self):
+        metrics.increment("connections")
         try:
+            with metrics.time("stage", stage="accept"):
+                codec = await handshake(self.reader, self.writer)
+            if codec is None:
+                log.warning("Connection closed from a failed protocol handshake", peer=self.peer)
+                return self.close()
+            self.codec = codec
             while True:
-                data = self.sock.recv(65536) ### MAIN DATA RECEIVE
-                if not data:
+                frame = await recv_frame(self.reader) ### MAIN DATA RECEIVE
+                if frame is None:
                     return self.close()
-                print(logTime() + f"Request received from {self.addr[0]}:{self.addr[1]}: " + data.decode())
-                result = self.router.route(loads(data.decode()))
-                self.sock.send(dumps(result).encode()) ### MAIN DATA RESPONSE
-        except BrokenPipeError:
-            print(logTime() + f"Connection from {self.addr[0]}:{self.addr[1]} closed unexpectedly")
+                with metrics.time("stage", stage="decode"):
+                    request = self.codec.decode(*frame)
+                if not isinstance(request, dict):
+                    raise FrameError("Request is not an object")
+                request_log.debug("Request received", peer=self.peer, id=request.get("id"), service=request.get("service"), operation=request.get("operation"))
+                # Heartbeats are answered by the read loop itself, before waiting for a free slot, so they measure the connection rather than the request backlog
+                if request.get("operation") == "ping":
+                    with metrics.time("stage", stage="send"):
+                        await send_frame(self.writer, self._encode(request, {"success": True, "response": "pong"}))
+                    continue
+                # Requests wait for one of the connection's slots in their own task, so the read loop never stops and heartbeats are always read.
+                # A connection whose backlog of waiting requests is full has its further requests rejected instead
+                if len(self._tasks) >= config.MAX_CONCURRENT_REQUESTS + config.MAX_PENDING_REQUESTS:
+                    metrics.increment("rejected", reason="connection backlog full")
+                    await send_frame(self.writer, self._encode(request, Overloaded("connection backlog full", 0.1).response()))
+                    continue
+                task = create_task(self._process(request))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except ConnectionError:
+            log.info("Connection closed unexpectedly", peer=self.peer)
+            return self.close()
+        except FrameError:
+            log.warning("Connection closed from sending a bad request", peer=self.peer)
             return self.close()
-        except JSONDecodeError:
-            print(logTime() + f"Connection from {self.addr[0]}:{self.addr[1]} closed from sending a bad request")
+        except CancelledError:
+            # The server is shutting down. This is the top of the connection task, so ending it here keeps asyncio from printing the cancellation
             return self.close()
-        except:
-            raise
-        
+
+    async def _process(self, request: dict):
+        # Requests run concurrently on their service's executor and respond as soon as they finish; the client matches responses by ID
+        start = perf_counter()
+        await self._slots.acquire()
+        admitted = False
+        service = None
+        try:
+            # Each service runs on its own threads and admission slots, and bounds how many of its requests may run or wait for them
+            if (target := self.router.service_for(request)) is not None:
+                if target.inflight >= target.max_inflight:
+                    raise Overloaded(f"{target.name} service busy", 0.1)
+                target.inflight += 1
+                service = target
+            executor = self.executor if target is None else target.executor
+            pool = None if target is None else target.name
+            # Server statistics are always answered, so the server can be observed while it is overloaded
+            if request.get("operation") != "stats":
+                with metrics.time("stage", stage="admission"):
+                    await self.admission.admit(self.addr[0], request_cost(request) if target is None else target.cost(request), pool)
+                admitted = True
+            if request.get("stream") is True:
+                result, extractions = await self._process_stream(request, executor)
+                frame = self._encode(request, result)
+            else:
+                # Large responses are encoded and compressed on the executor thread, off the event loop
+                def work() -> tuple[bytes, int]:
+                    result, extractions = self._route(request)
+                    return self._encode(request, result), extractions
+                frame, extractions = await self._run(executor, work)
+            if admitted:
+                admitted = False
+                self.admission.charge(self.addr[0], extractions)
+                self.admission.release(self.addr[0], pool)
+            with metrics.time("stage", stage="send"):
+                await send_frame(self.writer, frame) ### MAIN DATA RESPONSE
+        except Overloaded as error:
+            metrics.increment("rejected", reason=error.reason)
+            request_log.warning("Request rejected", peer=self.peer, id=request.get("id"), reason=error.reason)
+            try:
+                await send_frame(self.writer, self._encode(request, error.response()))
+            except ConnectionError:
+                pass
+        except ConnectionError:
+            log.info("Could not deliver response, connection is closed", peer=self.peer, id=request.get("id"))
+        finally:
+            if admitted:
+                self.admission.release(self.addr[0], pool)
+            if service is not None:
+                service.inflight -= 1
+            self._slots.release()
+            metrics.observe("request", perf_counter() - start, **self.router.labels(request))
+
+    async def _run(self, executor: Executor, function, *args):
+        # Runs blocking work on the given executor, recording how long it waited for a free thread
+        queued = perf_counter()
+        metrics.adjust("executor_queued", 1)
+        def work():
+            metrics.adjust("executor_queued", -1)
+            metrics.adjust("executor_active", 1)
+            metrics.observe("stage", perf_counter() - queued, stage="queue")
+            try:
+                return function(*args)
+            finally:
+                metrics.adjust("executor_active", -1)
+        return await get_running_loop().run_in_executor(executor, work)
+
+    def _route(self, request: dict, emit = None) -> tuple[None | dict, int]:
+        # Returns the result along with the number of extractions the services recorded for it on this thread
+        with metrics.time("stage", stage="route"):
+            result = self.router.route(request, emit)
+        metrics.increment("requests", **self.router.labels(request), success=str(result is not None and result.get("success") is True).lower())
+        return result, collect_work()
+
+    def _encode(self, request: dict, result: None | dict) -> bytes:
+        if result is None:
+            result = ClientRouter.unsupported("Unsupported service or operation.")
+        result["id"] = request.get("id")
+        with metrics.time("stage", stage="encode"):
+            return self.codec.encode(result)
+
+    async def _process_stream(self, request: dict, executor: Executor) -> tuple[dict, int]:
+        # The router runs on an executor thread and hands each batch of results back to the event loop as soon as it resolves
+        loop = get_running_loop()
+        batches = Queue()
+        emit = lambda batch: loop.call_soon_threadsafe(batches.put_nowait, batch)
+        def route() -> tuple[dict, int]:
+            try:
+                return self._route(request, emit)
+            finally:
+                emit(None)
+        future = create_task(self._run(executor, route))
+        while (batch := await batches.get()) is not None:
+            frame = self._encode(request, {"success": True, "partial": True, "response": batch})
+            with metrics.time("stage", stage="send"):
+                await send_frame(self.writer, frame)
+        return await future
+
     def close(self):
-        print(logTime() + f"Terminated connection from {self.addr[0]}:{self.addr[1]} successfully")
+        if self._closed:
+            return
+        self._closed = True
+        for task in self._tasks:
+            task.cancel()
+        log.info("Connection terminated", peer=self.peer)
         self.session_manager.remove_session(self)
-        return self.sock.close()
+        return self.writer.close()
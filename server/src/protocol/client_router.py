@@ -1,21 +1,72 @@
+# Import dependencies
+from typing import Callable
+
 # Import local dependencies
+from ..services.registry import ServiceRegistry, Service
 from ..services.youtube import YoutubeServiceHandler
-from ..util import logTime
+from ..services.http import HTTPServiceHandler
+from ..log import get_logger
+from ..metrics import metrics
+from .. import config
+
+log = get_logger("flexmusic.router")
 
 class ClientRouter(object):
+    '''
+    Routes requests to the registered service backends. A single router and its services are shared by every connection.
+    '''
+
     def __init__(self):
-        self.YoutubeServiceHandler = YoutubeServiceHandler()
+        self.services = ServiceRegistry()
+        youtube = YoutubeServiceHandler()
+        self.services.register("youtube", youtube, youtube.operations(), config.YOUTUBE_WORKERS, config.YOUTUBE_MAX_ACTIVE, config.YOUTUBE_MAX_INFLIGHT)
+        http = HTTPServiceHandler()
+        # Nothing is extracted for direct URLs, so every request costs the same
+        self.services.register("http", http, http.operations(), config.HTTP_WORKERS, config.HTTP_MAX_ACTIVE, config.HTTP_MAX_INFLIGHT, cost=lambda request: 1)
+        metrics.register_collector("services", self.services.stats)
+
+    def shutdown(self):
+        self.services.shutdown()
+
+    def service_for(self, data: dict) -> None | Service:
+        '''Returns the service that runs a request, or None if it runs on the shared executor'''
+        if data.get("operation") == "stats":
+            return None
+        return self.services.get(data.get("service"))
 
-    def route(self, data) -> dict:
+    def labels(self, data: dict) -> dict:
+        '''Returns the service and operation metric labels of a request. Names no registered service knows are reported as "unknown", so clients cannot add metric series'''
+        operation, service = data.get("operation"), self.services.get(data.get("service"))
+        if operation == "stats":
+            return {"operation": "stats", "service": "server"}
+        if not isinstance(operation, str) or not any(operation in known.operations for known in self.services):
+            operation = "unknown"
+        return {"operation": operation, "service": "unknown" if service is None else service.name}
+
+    def _respond(self, output: list[dict], emit: Callable[[list[dict]], None] = None, **extra) -> dict:
+        if emit is not None:
+            return {"success": True, "end": True, **extra}
+        return {"success": True, "response": output, **extra}
+
+    @staticmethod
+    def unsupported(error: str) -> dict:
+        return {"success": False, "error": error, "code": "unsupported"}
+
+    def route(self, data, emit: Callable[[list[dict]], None] = None) -> dict:
+        '''
+        Routes a request to the service handler for its service and operation.\n
+        For streaming requests, emit receives each batch of results as it becomes available, and the returned dictionary only marks the end of the stream.
+        '''
         try:
-            if data["service"] == "youtube":
-                if data["operation"] == "search":
-                    output = self.YoutubeServiceHandler.search(data["payload"]["query"], data["payload"]["amount"])
-                    return {"success": True, "response": output}
-                elif data["operation"] == "get":
-                    output = self.YoutubeServiceHandler.get(data["payload"]["url"])
-                    return {"success": True, "response": output}
+            if data.get("operation") == "stats":
+                return {"success": True, "response": metrics.snapshot()}
+            if (service := self.services.get(data.get("service"))) is None:
+                return self.unsupported(f"Unknown service {data.get('service')!r}; available services are {', '.join(self.services.names)}.")
+            if not isinstance(data.get("operation"), str) or (operation := service.operations.get(data["operation"])) is None:
+                return self.unsupported(f"The {service.name} service does not support the {data.get('operation')!r} operation.")
+            output, extra = operation(data["payload"], emit)
+            return self._respond(output, emit, **extra)
         except Exception as e:
-            print(logTime() + f"An error occured while processing request: {type(e).__name__} - {e} ({e.__traceback__.tb_next.tb_frame.f_code.co_filename}@{e.__traceback__.tb_next.tb_frame.f_lineno})")
+            metrics.increment("errors", operation=self.labels(data)["operation"])
+            log.error("An error occured while processing request", exc_info=e, service=data.get("service"), operation=data.get("operation"), error=f"{type(e).__name__}: {e}")
             return {"success": False, "error": "An error occured while handling this request."}
-
@@ -0,0 +1,124 @@
+# Import dependencies
+from asyncio import StreamReader, StreamWriter, IncompleteReadError
+from json import dumps, loads
+from struct import Struct
+from zlib import compress, decompressobj, error as ZlibError
+
+# Optional dependencies
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Import local dependencies
+from .. import config
+
+# Wire protocol version spoken by the server, and every older version it still accepts during the handshake
+PROTOCOL_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+
+# Frame header: unsigned 64-bit big-endian length of the frame body, whose top bit marks a zlib-compressed body (version 2)
+HEADER = Struct("!Q")
+COMPRESSED = 1 << 63
+
+# Upper bound on the size of a single request frame sent by a client, after decompression (responses are not capped)
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+
+# Body encodings and compression methods the server can use, in order of preference
+ENCODINGS = ("msgpack", "json") if msgpack is not None else ("json",)
+COMPRESSIONS = ("zlib",)
+
+class FrameError(Exception):
+    '''Raised when a peer sends a frame that violates the wire protocol'''
+    pass
+
+class Codec(object):
+    '''
+    Serializes messages into frames and back, using the encoding and compression negotiated during the handshake.\n
+    Bodies at least compression_threshold bytes long are compressed when compression is enabled.
+    '''
+
+    def __init__(self, encoding: str = "json", compression: None | str = None, compression_threshold: int = config.COMPRESSION_THRESHOLD):
+        self.encoding = encoding
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+
+    def __repr__(self) -> str:
+        return f"<Codec encoding={self.encoding} compression={self.compression}>"
+
+    def encode(self, message: dict) -> bytes:
+        '''Returns the complete frame, header included, holding the message'''
+        if self.encoding == "msgpack":
+            body = msgpack.packb(message, use_bin_type=True)
+        else:
+            body = dumps(message, separators=(",", ":")).encode()
+        if self.compression is not None and len(body) >= self.compression_threshold:
+            body = compress(body, 1)
+            return HEADER.pack(len(body) | COMPRESSED) + body
+        return HEADER.pack(len(body)) + body
+
+    def decode(self, body: bytes, compressed: bool = False, max_size: int = MAX_REQUEST_SIZE) -> dict:
+        try:
+            if compressed:
+                if self.compression is None:
+                    raise FrameError("Received a compressed frame without negotiating compression")
+                decompressor = decompressobj()
+                body = decompressor.decompress(body, max_size)
+                if decompressor.unconsumed_tail:
+                    raise FrameError(f"Decompressed frame exceeds the maximum of {max_size} bytes")
+            if self.encoding == "msgpack":
+                return msgpack.unpackb(body, raw=False)
+            return loads(body)
+        except FrameError:
+            raise
+        except (ValueError, TypeError, ZlibError) as error:
+            raise FrameError(f"Malformed {self.encoding} frame: {error}")
+
+async def recv_frame(reader: StreamReader, max_size: int = MAX_REQUEST_SIZE) -> None | tuple[bytes, bool]:
+    '''Receives a single frame from the stream and returns its body and whether it is compressed. Returns None if the peer closed the connection cleanly'''
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except IncompleteReadError as error:
+        if not error.partial:
+            return None
+        raise ConnectionResetError("Connection closed in the middle of a frame")
+    (length,) = HEADER.unpack(header)
+    compressed, length = bool(length & COMPRESSED), length & ~COMPRESSED
+    if length > max_size:
+        raise FrameError(f"Frame of {length} bytes exceeds the maximum of {max_size} bytes")
+    try:
+        return await reader.readexactly(length), compressed
+    except IncompleteReadError:
+        raise ConnectionResetError("Connection closed in the middle of a frame")
+
+async def send_frame(writer: StreamWriter, frame: bytes):
+    '''Sends a single frame built by Codec.encode to the stream and waits for the write buffer to drain'''
+    writer.write(frame)
+    await writer.drain()
+
+async def handshake(reader: StreamReader, writer: StreamWriter) -> None | Codec:
+    '''
+    Performs the server side of the version handshake and returns the negotiated codec, or None if the handshake failed.\n
+    The client opens with {"flexmusic": <version>, "encodings": [...], "compression": [...]} as plain JSON. The server replies, also as plain JSON, with its version, whether it accepted the connection, and the encoding and compression it picked from the client's offers.
+    '''
+    frame = await recv_frame(reader)
+    if frame is None:
+        return None
+    plain = Codec()
+    hello = plain.decode(*frame)
+    if not isinstance(hello, dict):
+        raise FrameError("Handshake is not an object")
+    if hello.get("flexmusic") not in SUPPORTED_VERSIONS:
+        await send_frame(writer, plain.encode({"success": False, "version": PROTOCOL_VERSION, "error": "Unsupported protocol version"}))
+        return None
+    # Offers are optional (version 1 clients send none), but must be lists of names when present
+    offers = {}
+    for field in ("encodings", "compression"):
+        offer = hello.get(field)
+        if offer is not None and not (isinstance(offer, list) and all(isinstance(name, str) for name in offer)):
+            raise FrameError(f"Handshake field {field} is not a list of names")
+        offers[field] = offer or ()
+    encoding = next((name for name in offers["encodings"] if name in ENCODINGS), "json")
+    compression = next((name for name in offers["compression"] if name in COMPRESSIONS), None)
+    await send_frame(writer, plain.encode({"success": True, "version": PROTOCOL_VERSION, "encoding": encoding, "compression": compression}))
+    return Codec(encoding, compression)
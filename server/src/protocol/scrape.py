@@ -0,0 +1,30 @@
+# Import dependencies
+from asyncio import StreamReader, StreamWriter, Server, TimeoutError, start_server, wait_for
+
+# Import local dependencies
+from ..metrics import metrics
+
+# Seconds a scrape client has to send its request line and headers
+SCRAPE_TIMEOUT = 5
+
+async def _handle_scrape(reader: StreamReader, writer: StreamWriter):
+    # Minimal HTTP/1.1 responder: GET /metrics returns the Prometheus text format, anything else is a 404
+    try:
+        request_line = await wait_for(reader.readline(), SCRAPE_TIMEOUT)
+        while (line := await wait_for(reader.readline(), SCRAPE_TIMEOUT)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.split()
+        if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+            status, body = "200 OK", metrics.render().encode()
+        else:
+            status, body = "404 Not Found", b"Not Found\n"
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+    except (TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start_scrape_server(host: str, port: int) -> Server:
+    '''Starts the plain-text metrics endpoint, served at http://<host>:<port>/metrics'''
+    return await start_server(_handle_scrape, host, port, reuse_address=True)
@@ -1,31 +1,61 @@
 # Import dependencies
-from socket import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 # Import local dependencies
 from src.session import SessionManager, session_bootstrapper
+from src.protocol.client_router import ClientRouter
+from src.protocol.scrape import start_scrape_server
+from src.admission import AdmissionController
+from src.metrics import metrics
+from src.log import get_logger, start_logging, stop_logging
 from src.motd import splash
+from src import config
 from .shutdown import shutdown, error_shutdown, close_server
 
-def start_server(host: str = "0.0.0.0", port: int = 5000) -> socket:
-    server = socket(AF_INET, SOCK_STREAM)
-    server.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
-    server.bind((host, port))
+log = get_logger("flexmusic.server")
+
+async def start_server(session_manager: SessionManager, router: ClientRouter, executor: ThreadPoolExecutor, admission: AdmissionController, host: str = config.HOST, port: int = config.PORT) -> asyncio.Server:
+    server = await asyncio.start_server(
+        lambda reader, writer: session_bootstrapper(reader, writer, session_manager, router, executor, admission),
+        host, port, backlog=config.BACKLOG, reuse_address=True
+    )
     splash(host, port)
     return server
 
-def runtime(server: socket):
+async def runtime():
     session_manager = SessionManager()
+    router = ClientRouter()
+    executor = ThreadPoolExecutor(max_workers=config.EXECUTOR_WORKERS, thread_name_prefix="flexmusic-worker")
+    admission = AdmissionController()
+    for service in router.services:
+        admission.add_pool(service.name, service.max_active)
+    server = await start_server(session_manager, router, executor, admission)
+    metrics.register_gauge("active_sessions", lambda: len(session_manager))
+    metrics.register_gauge("executor_workers", lambda: config.EXECUTOR_WORKERS)
+    metrics.register_collector("admission", admission.stats)
+    scrape_server = None
+    if config.METRICS_PORT:
+        scrape_server = await start_scrape_server(config.METRICS_HOST, config.METRICS_PORT)
+        log.info("Serving metrics", url=f"http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
     try:
-        while True:
-            server.listen(5)
-            sock, addr = server.accept()
-            session_bootstrapper(sock, addr, session_manager)
-    except KeyboardInterrupt:
-        shutdown(session_manager)
+        await server.serve_forever()
+    except asyncio.CancelledError:
+        shutdown(session_manager, router)
+        raise
     except Exception as error:
-        error_shutdown(error, session_manager)
+        error_shutdown(error, session_manager, router)
     finally:
+        if scrape_server is not None:
+            scrape_server.close()
         close_server(server)
+        executor.shutdown(wait=False, cancel_futures=True)
 
 def bootstrap():
-    runtime(start_server())
+    start_logging()
+    try:
+        asyncio.run(runtime())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_logging()
@@ -0,0 +1,83 @@
+# Import dependencies
+from hashlib import blake2b
+from itertools import islice
+from random import Random
+from time import sleep, time
+from urllib.parse import urlsplit, parse_qs
+
+# Import local dependencies
+from .. import config
+
+class FakeExtractionError(Exception):
+    '''Raised by FakeYoutubeDL for the share of extractions configured to fail'''
+    pass
+
+def _video_id(*parts) -> str:
+    # Stable 11-character ID in the YouTube alphabet, derived from the given parts
+    digest = blake2b(":".join(map(str, parts)).encode(), digest_size=9).digest()
+    return "".join("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"[byte % 64] for byte in digest)[:11]
+
+class FakeYoutubeDL(object):
+    '''
+    Deterministic, offline stand-in for yt_dlp.YoutubeDL, used for benchmarking.\n
+    It answers searches, playlist and video URLs with generated data shaped like yt-dlp output. Latency, stream URL size, failure rate and playlist length come from the FLEXMUSIC_FAKE_* settings. The same URL always produces the same data, delay and outcome.
+    '''
+
+    def __init__(self, params: dict = None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def close(self):
+        pass
+
+    def _entry(self, id: str) -> dict:
+        return {
+            "id": id,
+            "title": f"Track {id}",
+            "uploader": f"Artist {id[:3]}",
+            "duration": 120 + int.from_bytes(id.encode()[:2], "big") % 300,
+            "thumbnail": f"https://i.ytimg.com/vi/{id}/hqdefault.jpg"
+        }
+
+    def _entries(self, url: str, count: int):
+        for index in range(count):
+            yield self._entry(_video_id(url, index))
+
+    def _playlist_slice(self, entries, count: int):
+        # Mirrors yt-dlp's 1-based, inclusive "start:end" playlist_items syntax
+        if not (items := self.params.get("playlist_items")):
+            return entries
+        start, _, end = str(items).partition(":")
+        start = int(start or 1) - 1
+        end = int(end) if end else count
+        return islice(entries, start, end)
+
+    def extract_info(self, url: str, download: bool = False, **kwargs) -> dict:
+        rng = Random(f"{config.FAKE_SEED}:{url}")
+        sleep(max(0.0, rng.gauss(config.FAKE_LATENCY, config.FAKE_LATENCY * config.FAKE_JITTER)))
+        if rng.random() < config.FAKE_FAILURE_RATE:
+            raise FakeExtractionError(f"Simulated extraction failure for {url}")
+        if url.startswith("ytsearch"):
+            amount, _, query = url[len("ytsearch"):].partition(":")
+            return {"id": query, "entries": list(self._entries(query, int(amount or 1)))}
+        if "list" in (query := parse_qs(urlsplit(url).query)):
+            entries = self._playlist_slice(self._entries(query["list"][0], config.FAKE_PLAYLIST_SIZE), config.FAKE_PLAYLIST_SIZE)
+            return {"id": query["list"][0], "entries": entries if self.params.get("lazy_playlist") else list(entries)}
+        id = query["v"][0] if "v" in query else _video_id(url)
+        source = f"https://rr1---sn-fake.googlevideo.com/videoplayback?expire={int(time()) + 21600}&id={id}&itag=251&pad="
+        source += "x" * max(0, config.FAKE_PAYLOAD_SIZE - len(source))
+        info = self._entry(id)
+        # Like yt-dlp, the chosen format is only merged into the info dict when it is processed
+        info["formats"] = [
+            {"format_id": "18", "url": source.replace("itag=251", "itag=18"), "acodec": "mp4a.40.2", "vcodec": "avc1.42001E", "tbr": 500},
+            {"format_id": "140", "url": source.replace("itag=251", "itag=140"), "acodec": "mp4a.40.2", "vcodec": "none", "abr": 129},
+            {"format_id": "251", "url": source, "acodec": "opus", "vcodec": "none", "abr": 135}
+        ]
+        if kwargs.get("process", True):
+            info["url"] = source
+        return info
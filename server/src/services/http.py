@@ -0,0 +1,46 @@
+# Import dependencies
+from pathlib import PurePosixPath
+from typing import Callable
+from urllib.parse import urlsplit, unquote
+
+class HTTPServiceHandler(object):
+    '''
+    Service for audio files served directly over HTTP or HTTPS.\n
+    The ID of a track is its URL, which is also its audio stream, so nothing is extracted and no worker processes are needed. The title comes from the file name and the artist from the host name. Searching is not supported.
+    '''
+
+    def _track(self, url: str, resolve: bool = True) -> dict:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.netloc:
+            raise ValueError(f"Not an HTTP URL: {url}")
+        data = {
+            "id": url,
+            "title": PurePosixPath(unquote(parts.path)).stem or parts.netloc,
+            "artist": parts.netloc,
+            "duration": None,
+            "cover": None
+        }
+        if resolve:
+            data["source"] = url
+        return data
+
+    def _emit(self, results: list[dict], emit: Callable[[list[dict]], None] = None) -> list[dict]:
+        if emit is not None and results:
+            emit(results)
+        return results
+
+    def get(self, url: str, resolve: bool = True, emit: Callable[[list[dict]], None] = None) -> list[dict]:
+        return self._emit([self._track(url, resolve)], emit)
+
+    def resolve(self, ids: list[str], emit: Callable[[list[dict]], None] = None) -> list[dict]:
+        return self._emit([self._track(id) for id in ids], emit)
+
+    def operations(self) -> dict:
+        '''Dispatch table of the operations this service answers, for the ServiceRegistry'''
+        return {"get": self._get_operation, "resolve": self._resolve_operation}
+
+    def _get_operation(self, payload: dict, emit: Callable[[list[dict]], None] = None) -> tuple[list[dict], dict]:
+        return self.get(payload["url"], payload.get("resolve", True), emit), {"next": None}
+
+    def _resolve_operation(self, payload: dict, emit: Callable[[list[dict]], None] = None) -> tuple[list[dict], dict]:
+        return self.resolve(payload["ids"] if "ids" in payload else [payload["id"]], emit), {}
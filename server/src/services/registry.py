@@ -0,0 +1,79 @@
+# Import dependencies
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+# Import local dependencies
+from ..admission import request_cost
+from ..log import get_logger
+
+log = get_logger("flexmusic.registry")
+
+# An operation takes the request payload and the streaming emit callback (None for regular requests),
+# and returns the result list along with any extra response fields
+Operation = Callable[[dict, None | Callable[[list[dict]], None]], tuple[list[dict], dict]]
+
+class Service(object):
+    '''
+    A backend registered with the ServiceRegistry.\n
+    Every service runs its operations on its own worker threads and its own pool of max_active admission slots, and may only have max_inflight requests running or waiting for admission at once, so a slow backend queues and rejects its own requests without taking threads or admission slots from the others.
+    '''
+
+    def __init__(self, name: str, handler, operations: dict[str, Operation], workers: int, max_active: int, max_inflight: int, cost: Callable[[dict], int] = request_cost):
+        self.name, self.handler, self.operations = name, handler, operations
+        self.cost = cost # Estimated work of a request, used by admission control to weigh waiting requests
+        self.workers, self.max_active, self.max_inflight = workers, max_active, max_inflight
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"flexmusic-{name}")
+        self.inflight = 0 # Only changed from the event loop thread
+
+    def stats(self) -> dict:
+        return {
+            "operations": sorted(self.operations),
+            "workers": self.workers,
+            "max_active": self.max_active,
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if hasattr(self.handler, "shutdown"):
+            self.handler.shutdown()
+
+class ServiceRegistry(object):
+    '''
+    Registry of the service backends of the server, shared by every connection.\n
+    Requests are routed by looking up their service and operation in a dispatch table, so new backends only need to be registered with their operations.
+    '''
+
+    def __init__(self):
+        self._services: dict[str, Service] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._services
+
+    def __iter__(self):
+        return iter(list(self._services.values()))
+
+    def register(self, name: str, handler, operations: dict[str, Operation], workers: int, max_active: int, max_inflight: int, cost: Callable[[dict], int] = request_cost) -> Service:
+        if name in self._services:
+            raise ValueError(f"Service {name} is already registered")
+        self._services[name] = service = Service(name, handler, operations, workers, max_active, max_inflight, cost)
+        log.info("Registered service", service=name, operations=",".join(sorted(operations)), workers=workers)
+        return service
+
+    def get(self, name: str) -> None | Service:
+        # Names come straight from client requests, where a list or object would not even be hashable
+        if not isinstance(name, str):
+            return None
+        return self._services.get(name)
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._services)
+
+    def stats(self) -> dict:
+        return {name: service.stats() for name, service in self._services.items()}
+
+    def shutdown(self):
+        for service in self._services.values():
+            service.shutdown()
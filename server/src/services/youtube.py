@@ -1,22 +1,109 @@
 # Import dependencies
 from time import perf_counter as time
-from yt_dlp import YoutubeDL as YoutubeDLP
-from multiprocessing import Pool
-from youtube_dl import YoutubeDL
+from itertools import islice
+from typing import Callable
+from multiprocessing import get_context
+from signal import signal, SIGINT, SIG_IGN
+from threading import local, Lock
+import sqlite3
 
 # Import local dependencies
-from ..util import logTime
+from ..log import get_logger, request_log
+from ..cache import StreamCache, SearchCache
+from ..persistence import CacheStore
+from ..coalesce import SingleFlight
+from ..admission import record_work
+from ..metrics import metrics
+from .. import config
+
+SOURCE_RETRIEVAL_OPTIONS = {
+    'quiet': True,
+    'skip_download': True,
+    'simulate': True,
+    # Audio formats come from the player response alone; manifests and translated subtitles are never fetched
+    'youtube_include_dash_manifest': False,
+    'youtube_include_hls_manifest': False,
+    'extractor_args': {'youtube': {'skip': ['dash', 'hls', 'translated_subs']}}
+}
+
+def load_extractor(backend: str = config.EXTRACTOR) -> type:
+    '''Imports and returns the YoutubeDL class of the configured extraction backend'''
+    if backend == "fake":
+        from .fake_extractor import FakeYoutubeDL
+        return FakeYoutubeDL
+    from yt_dlp import YoutubeDL
+    return YoutubeDL
+
+def _best_audio_url(info: dict) -> str:
+    '''Returns the stream URL of the highest bitrate audio-only format of an unprocessed info dict, or of any format carrying audio if there is none'''
+    formats = [format for format in info.get("formats") or () if format.get("url") and format.get("acodec") not in (None, "none") and not format.get("has_drm")]
+    if not formats:
+        raise ValueError(f"No audio format found for {info.get('id')}")
+    audio_only = [format for format in formats if format.get("vcodec") == "none"]
+    return max(audio_only or formats, key=lambda format: format.get("abr") or format.get("tbr") or 0)["url"]
+
+# Extractor owned by each pool worker process, built once by _warm_up_worker
+_worker_api = None
+
+def _warm_up_worker(options: dict, backend: str):
+    # Runs once per worker process: import the extractor and build its YoutubeDL object up front so requests never pay for it
+    global _worker_api
+    # Shutdown is driven by the server process, so workers must not die from the terminal's SIGINT
+    signal(SIGINT, SIG_IGN)
+    _worker_api = load_extractor(backend)(options)
+
+def _process_audio_stream(data: dict) -> dict:
+    # The info dict is left unprocessed: format sorting, selection and field sanitizing are skipped, and bestaudio is picked directly
+    info = _worker_api.extract_info(f"https://youtube.com/watch?v={data['id']}", download=False, process=False)
+    data['source'] = _best_audio_url(info)
+    return data
+
+def _track_metadata(entry: dict) -> dict:
+    data = {}
+    data["id"] = entry["id"]
+    data["title"] = entry["title"]
+    try:
+        data["artist"] = entry["uploader"]
+    except KeyError:
+        data["artist"] = entry["channel"]
+    data["duration"] = entry["duration"]
+    try:
+        data["cover"] = entry["thumbnail"]
+    except KeyError:
+        data["cover"] = entry["thumbnails"][0]["url"]
+    return data
+
+log = get_logger("flexmusic.youtube")
 
 class YoutubeServiceHandler(object):
-    def __init__(self):
-        self.source_retrieval_options = {
-            'format': 'bestaudio',
-            'quiet': True,
-            'skip_download': True,
-            'forceurl': True,
-            'simulate': True,
-            'youtube_include_dash_manifest': False
-        }
+    def __init__(self, processes: int = config.EXTRACTION_WORKERS):
+        self.source_retrieval_options = SOURCE_RETRIEVAL_OPTIONS
+        # Spawned (not forked) so workers never inherit the server's threads or sockets
+        self.pool = get_context("spawn").Pool(processes=processes, initializer=_warm_up_worker, initargs=(self.source_retrieval_options, config.EXTRACTOR))
+        self.YoutubeDL = load_extractor()
+        self._local = local()
+        self._extractors = []
+        self._extractors_lock = Lock()
+        self.search_cache = SearchCache(config.SEARCH_CACHE_ENTRIES, config.SEARCH_CACHE_TTL)
+        self.stream_cache = StreamCache(config.STREAM_CACHE_BYTES, config.STREAM_CACHE_EXPIRY_MARGIN, config.STREAM_CACHE_DEFAULT_TTL)
+        self.inflight = SingleFlight()
+        self.store = None
+        if config.PERSIST_PATH:
+            try:
+                self.store = CacheStore(config.PERSIST_PATH)
+                self.store.load(self.stream_cache, self.search_cache)
+            except (OSError, sqlite3.Error, ValueError) as error:
+                # The persistent cache only saves work, so the server still starts without it
+                log.warning("Persistent cache unavailable", path=config.PERSIST_PATH, error=str(error))
+                if self.store is not None:
+                    self.store.close()
+                    self.store = None
+        metrics.register_gauge("extraction_workers", lambda: processes)
+        metrics.register_collector("search_cache", self.search_cache.stats)
+        metrics.register_collector("stream_cache", self.stream_cache.stats)
+        metrics.register_collector("coalescing", self.inflight.stats)
+        if self.store is not None:
+            metrics.register_collector("persistence", self.store.stats)
         self.search_options = {
             'quiet': True,
             'simulate': True,
@@ -24,82 +111,165 @@ class YoutubeServiceHandler(object):
             'noplaylist': True,
             'extract_flat': True
         }
+        self.playlist_options = dict(self.search_options, lazy_playlist=True)
 
-    def _process_audio_stream(self, data: dict) -> dict:
-        with YoutubeDL(self.source_retrieval_options) as api:
-            data['source'] = api.extract_info(f"https://youtube.com/watch?v={data['id']}", download=False)["formats"][0]["url"]
-        return data
+    def _extractor(self, name: str, options: dict):
+        # Every executor thread builds each kind of YoutubeDL once and keeps reusing it, along with its loaded extractors and open HTTP connections
+        if (api := getattr(self._local, name, None)) is None:
+            api = self.YoutubeDL(options)
+            setattr(self._local, name, api)
+            with self._extractors_lock:
+                self._extractors.append(api)
+        return api
 
-    def get_audio_streams(self, sources: list[dict]) -> list[dict]:
-        print(logTime() + f"Fetching audio streams for {len(sources)} sources...")
+    def get_audio_streams(self, sources: list[dict], emit: Callable[[list[dict]], None] = None) -> list[dict]:
+        '''
+        Resolves the audio stream URL of every source, using cached URLs where possible.\n
+        Video IDs that another request is already resolving are not extracted again; the result of that request is shared instead.\n
+        If emit is given, sources are passed to it in batches as soon as they are resolved (cache hits first, then each extraction as it finishes) instead of waiting for the whole batch.
+        '''
         st = time()
-        pool = Pool(processes=len(sources))
-        processed_sources = pool.map(self._process_audio_stream, sources)
+        hits, leading, following = [], {}, []
+        for data in sources:
+            if (source := self.stream_cache.get(data["id"])) is not None:
+                data["source"] = source
+                hits.append(data)
+            elif data["id"] in leading:
+                leading[data["id"]].append(data)
+            else:
+                future, leader = self.inflight.claim(("resolve", data["id"]))
+                if leader:
+                    leading[data["id"]] = [data]
+                else:
+                    following.append((data, future))
+        if emit is not None and hits:
+            emit(hits)
+        try:
+            # Extraction results are matched back to every source sharing the same video ID
+            misses = [duplicates[0] for duplicates in leading.values()]
+            record_work(len(misses))
+            metrics.adjust("extraction_in_flight", len(misses))
+            resolve_start = time()
+            processed_sources = self.pool.imap_unordered(_process_audio_stream, misses) if emit is not None else self.pool.map(_process_audio_stream, misses)
+            for processed in processed_sources:
+                metrics.adjust("extraction_in_flight", -1)
+                metrics.observe("stage", time() - resolve_start, stage="resolve")
+                self.stream_cache.put_source(processed["id"], processed["source"])
+                if self.store is not None:
+                    self.store.put_stream(processed["id"], processed["source"], self.stream_cache.ttl_for(processed["source"]))
+                self.inflight.resolve(("resolve", processed["id"]), processed["source"])
+                for data in leading[processed["id"]]:
+                    data["source"] = processed["source"]
+                if emit is not None:
+                    emit(leading[processed["id"]])
+        except BaseException as error:
+            for id in leading:
+                if self.inflight.fail(("resolve", id), error):
+                    metrics.adjust("extraction_in_flight", -1)
+            raise
+        for data, future in following:
+            data["source"] = future.result()
+            if emit is not None:
+                emit([data])
         et = time()
-        print(logTime() + f"Successfully fetched audio streams for {len(sources)} sources ({str(round(et - st, 2))}s)")
-        return processed_sources
+        request_log.debug("Fetched audio streams", sources=len(sources), cached=len(hits), shared=len(following), seconds=round(et - st, 3))
+        return sources
+
+    def shutdown(self):
+        log.info("Stopping audio stream extraction workers")
+        self.pool.close()
+        self.pool.join()
+        with self._extractors_lock:
+            extractors, self._extractors = self._extractors, []
+        for api in extractors:
+            api.close()
+        for name, cache in (("Search", self.search_cache), ("Stream", self.stream_cache)):
+            stats = cache.stats()
+            log.info(f"{name} cache statistics", hits=stats["hits"], misses=stats["misses"], evictions=stats["evictions"])
+        log.info("Coalescing statistics", coalesced=self.inflight.coalesced, executed=self.inflight.executed)
+        if self.store is not None:
+            log.info("Flushing persistent cache", queued=self.store.stats()["queued"])
+            self.store.close()
 
-    def search(self, query: str, amount: int = 10) -> list[dict]:
+    def _finish(self, results: list[dict], resolve: bool, emit: Callable[[list[dict]], None] = None) -> list[dict]:
+        if resolve:
+            return self.get_audio_streams(results, emit)
+        if emit is not None and results:
+            emit(results)
+        return results
+
+    def resolve(self, ids: list[str], emit: Callable[[list[dict]], None] = None) -> list[dict]:
+        return self.get_audio_streams([{"id": id} for id in ids], emit)
+
+    def operations(self) -> dict:
+        '''Dispatch table of the operations this service answers, for the ServiceRegistry'''
+        return {"search": self._search_operation, "get": self._get_operation, "resolve": self._resolve_operation}
+
+    def _search_operation(self, payload: dict, emit: Callable[[list[dict]], None] = None) -> tuple[list[dict], dict]:
+        return self.search(payload["query"], payload["amount"], payload.get("resolve", True), emit), {}
+
+    def _get_operation(self, payload: dict, emit: Callable[[list[dict]], None] = None) -> tuple[list[dict], dict]:
+        output, next_offset = self.get(payload["url"], payload.get("resolve", True), emit, payload.get("offset", 0), payload.get("limit", config.PLAYLIST_PAGE_SIZE))
+        return output, {"next": next_offset}
+
+    def _resolve_operation(self, payload: dict, emit: Callable[[list[dict]], None] = None) -> tuple[list[dict], dict]:
+        return self.resolve(payload["ids"] if "ids" in payload else [payload["id"]], emit), {}
+
+    def search(self, query: str, amount: int = 10, resolve: bool = True, emit: Callable[[list[dict]], None] = None) -> list[dict]:
+        if (search_results := self.search_cache.get_results("youtube", query, amount)) is not None:
+            request_log.debug("YouTube query served from cache", query=query, results=len(search_results))
+            return self._finish(search_results, resolve, emit)
+        # Identical searches running at the same time share one extraction; every caller gets its own copy of the results
+        search_results = self.inflight.do(("search", SearchCache.normalize(query), amount), self._search, query, amount)
+        return self._finish([dict(data) for data in search_results], resolve, emit)
+
+    def _search(self, query: str, amount: int) -> list[dict]:
         search_results = []
-        with YoutubeDLP(self.search_options) as api:
-            print(logTime() + f"Executing YouTube search with query '{query}'...")
-            st = time()
-            raw_data = api.extract_info(f"ytsearch{amount}:{query}", download=False)["entries"]
-            et = time()
-            print(logTime() + f"YouTube query finished with {len(raw_data)} results ({str(round(et - st, 2))}s)")
-            for i in range(len(raw_data)):
-                data = {}
-                data["id"] = raw_data[i]["id"]
-                data["title"] = raw_data[i]["title"]
-                try:
-                    data["artist"] = raw_data[i]["uploader"]
-                except KeyError:
-                    data["artist"] = raw_data[i]["channel"]
-                data["duration"] = raw_data[i]["duration"]
-                try:
-                    data["cover"] = raw_data[i]["thumbnail"]
-                except KeyError:
-                    data["cover"] = raw_data[i]["thumbnails"][0]["url"]
-                search_results.append(data)
-        search_results = self.get_audio_streams(search_results)
+        api = self._extractor("search", self.search_options)
+        st = time()
+        record_work()
+        raw_data = api.extract_info(f"ytsearch{amount}:{query}", download=False)["entries"]
+        et = time()
+        metrics.observe("stage", et - st, stage="search")
+        request_log.debug("YouTube query finished", query=query, results=len(raw_data), seconds=round(et - st, 3))
+        for entry in raw_data:
+            search_results.append(_track_metadata(entry))
+        self.search_cache.put_results("youtube", query, amount, search_results)
+        if self.store is not None:
+            self.store.put_search("youtube", query, amount, search_results, self.search_cache.ttl)
         return search_results
 
-    def get(self, url: str) -> list[dict]:
+    def get(self, url: str, resolve: bool = True, emit: Callable[[list[dict]], None] = None, offset: int = 0, limit: int = config.PLAYLIST_PAGE_SIZE) -> tuple[list[dict], None | int]:
+        '''
+        Fetches the track behind a video URL, or one page of the tracks behind a playlist URL.\n
+        Playlist entries are read lazily and only the requested page is ever held in memory. Returns the page and the offset of the next page, which is None once the playlist is exhausted.
+        '''
+        limit = max(1, min(limit, config.PLAYLIST_PAGE_SIZE))
+        # Identical page requests running at the same time share one playlist expansion; every caller gets its own copy of the results
+        results, next_offset = self.inflight.do(("get", url, offset, limit), self._get, url, offset, limit)
+        return self._finish([dict(data) for data in results], resolve, emit), next_offset
+
+    def _get(self, url: str, offset: int, limit: int) -> tuple[list[dict], None | int]:
+        api = self._extractor("playlist", self.playlist_options)
+        # The thread's own instance is reused, so the page is selected by changing its options for this call only.
+        # One entry past the page is requested so the end of the playlist can be detected without a second request.
+        # Only the page is held in memory, but yt-dlp still fetches the playlist's continuation pages from the start to reach the offset,
+        # so later pages of very long playlists take more upstream requests than earlier ones
+        api.params["playlist_items"] = f"{offset + 1}:{offset + limit + 1}"
         results = []
-        with YoutubeDLP(self.search_options) as api:
-            print(logTime() + f"Getting YouTube data from '{url}'...")
-            st = time()
-            raw_data = api.extract_info(url, download=False)
-            et = time()
-            print(logTime() + f"YouTube data fetch for '{url}' completed ({str(round(et - st, 2))}s)")
-            if not "entries" in raw_data:
-                data = {}
-                data["id"] = raw_data["id"]
-                data["title"] = raw_data["title"]
-                try:
-                    data["artist"] = raw_data["uploader"]
-                except KeyError:
-                    data["artist"] = raw_data["channel"]
-                data["duration"] = raw_data["duration"]
-                try:
-                    data["cover"] = raw_data["thumbnail"]
-                except KeyError:
-                    data["cover"] = raw_data["thumbnails"][0]["url"]
-                results.append(data)
-            else:
-                for i in range(len(raw_data["entries"])):
-                    data = {}
-                    data["id"] = raw_data["entries"][i]["id"]
-                    data["title"] = raw_data["entries"][i]["title"]
-                    try:
-                        data["artist"] = raw_data["entries"][i]["uploader"]
-                    except KeyError:
-                        data["artist"] = raw_data["entries"][i]["channel"]
-                    data["duration"] = raw_data["entries"][i]["duration"]
-                    try:
-                        data["cover"] = raw_data["entries"][i]["thumbnail"]
-                    except KeyError:
-                        data["cover"] = raw_data["entries"][i]["thumbnails"][0]["url"]
-                    results.append(data)
-            results = self.get_audio_streams(results)
-            return results
\ No newline at end of file
+        next_offset = None
+        st = time()
+        record_work()
+        raw_data = api.extract_info(url, download=False)
+        et = time()
+        metrics.observe("stage", et - st, stage="playlist")
+        request_log.debug("YouTube data fetch completed", url=url, offset=offset, limit=limit, seconds=round(et - st, 3))
+        if not "entries" in raw_data:
+            results.append(_track_metadata(raw_data))
+        else:
+            for entry in islice(raw_data["entries"], limit + 1):
+                if len(results) == limit:
+                    next_offset = offset + limit
+                    break
+                results.append(_track_metadata(entry))
+        return results, next_offset
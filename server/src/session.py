@@ -1,24 +1,30 @@
 # Import dependencies
-from socket import socket
+from asyncio import StreamReader, StreamWriter
+from concurrent.futures import Executor
 
 # Import local dependencies
 from src.protocol.client_handler import ClientHandler
+from src.protocol.client_router import ClientRouter
+from src.admission import AdmissionController
 
 class SessionManager:
     def __init__(self):
-        self._sessions = []
+        self._sessions: set[ClientHandler] = set()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
 
     @property
     def sessions(self) -> list[ClientHandler]:
-        return self._sessions
+        return list(self._sessions)
 
     def add_session(self, session: ClientHandler):
-        self._sessions.append(session)
+        self._sessions.add(session)
 
     def remove_session(self, session: ClientHandler):
-        self._sessions.remove(session)
+        self._sessions.discard(session)
 
-def session_bootstrapper(sock: socket, addr: tuple[str, int], session_manager: SessionManager):
-    session = ClientHandler(sock, addr, session_manager)
-    session.start()
-    session_manager.add_session(session)
\ No newline at end of file
+async def session_bootstrapper(reader: StreamReader, writer: StreamWriter, session_manager: SessionManager, router: ClientRouter, executor: Executor, admission: AdmissionController):
+    session = ClientHandler(reader, writer, session_manager, router, executor, admission)
+    session_manager.add_session(session)
+    await session.run()
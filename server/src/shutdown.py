@@ -1,18 +1,22 @@
 # Import dependencies
-from socket import socket
+from asyncio import Server
 from traceback import TracebackException
 
 # Import local dependencies
 from .session import SessionManager
-from .util import logTime
+from .protocol.client_router import ClientRouter
+from .log import get_logger
 
-def shutdown(session_manager: SessionManager):
-    print(logTime() + "Received server shutdown signal")
+log = get_logger("flexmusic.server")
+
+def shutdown(session_manager: SessionManager, router: ClientRouter):
+    log.info("Received server shutdown signal")
     for session in session_manager.sessions:
-        print(logTime() + f"Closing connection to {session.addr[0]}:{session.addr[1]}...")
+        log.info("Closing connection", peer=session.peer)
         session.close()
+    router.shutdown()
 
-def error_shutdown(error: Exception, session_manager: SessionManager):
+def error_shutdown(error: Exception, session_manager: SessionManager, router: ClientRouter):
     print("")
     print(" A fatal error occured while running the server and the server must shut down.")
     print(" A full traceback of the error can be found below:")
@@ -23,8 +27,8 @@ def error_shutdown(error: Exception, session_manager: SessionManager):
     print(" Please report this error at: ")
     print(" https://github.com/89mpxf/flexmusic/issues")
     print("")
-    return shutdown(session_manager)
+    return shutdown(session_manager, router)
 
-def close_server(server: socket):
-    print(logTime() + "Server shutdown successfully")
+def close_server(server: Server):
+    log.info("Server shutdown successfully")
     server.close()
\ No newline at end of file
@@ -1,5 +0,0 @@
-# Import dependencies
-from datetime import datetime
-
-def logTime() -> str:
-    return " [" + str(datetime.now().strftime("%a %b %d %H:%M:%S")) + "] "
\ No newline at end of file
@@ -0,0 +1,6 @@
+# Import dependencies
+import os
+import sys
+
+# The server runs from its own directory and imports its modules as src.*, so the tests do the same
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,140 @@
+# Import dependencies
+import asyncio
+import pytest
+
+# Import local dependencies
+from src.admission import AdmissionController, Overloaded, record_work, collect_work
+
+def controller(**options) -> AdmissionController:
+    limits = {"capacity": 1, "queue_size": 100, "queue_timeout": 5, "client_inflight": 100, "client_rate": 1000, "client_burst": 1000}
+    return AdmissionController(**(limits | options))
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_admits_immediately_below_capacity():
+    async def main():
+        admission = controller(capacity=2)
+        await admission.admit("a", 1)
+        await admission.admit("b", 1)
+        assert admission.stats()["active"] == 2
+        admission.release("a")
+        admission.release("b")
+        assert admission.stats()["active"] == 0
+    asyncio.run(main())
+
+def test_cheap_request_overtakes_queued_playlist_flood():
+    async def main():
+        admission = controller()
+        started = []
+        async def request(key: str, cost: int):
+            await admission.admit(key, cost)
+            started.append(key)
+        await admission.admit("holder", 1)
+        flood = [asyncio.create_task(request("flood", 101)) for _ in range(5)]
+        await settle()
+        search = asyncio.create_task(request("search", 1))
+        await settle()
+        assert admission.queued == 6
+        admission.release("holder")
+        await settle()
+        assert started == ["search"]
+        for _ in flood:
+            admission.release(started[-1])
+            await settle()
+        await asyncio.gather(search, *flood)
+        assert started == ["search"] + ["flood"] * 5
+        assert admission.queued == 0
+    asyncio.run(main())
+
+def test_pools_do_not_wait_for_each_other():
+    async def main():
+        admission = controller()
+        admission.add_pool("slow", 1)
+        await admission.admit("a", 1, "slow")
+        waiting = asyncio.create_task(admission.admit("a", 1, "slow"))
+        await settle()
+        await asyncio.wait_for(admission.admit("b", 1), 0.1)
+        assert admission.stats()["pools"]["slow"] == {"active": 1, "queued": 1, "capacity": 1}
+        admission.release("a", "slow")
+        await waiting
+        assert admission.stats()["pools"]["slow"]["active"] == 1
+    asyncio.run(main())
+
+def test_queue_timeout_rejects_and_withdraws():
+    async def main():
+        admission = controller(queue_timeout=0.05)
+        await admission.admit("a", 1)
+        with pytest.raises(Overloaded) as error:
+            await admission.admit("b", 1)
+        assert error.value.reason == "queue timeout"
+        assert admission.queued == 0
+        admission.release("a")
+        assert admission.stats()["active"] == 0
+        assert admission.rejected == {"queue timeout": 1}
+    asyncio.run(main())
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def main():
+        admission = controller()
+        await admission.admit("a", 1)
+        cancelled = asyncio.create_task(admission.admit("b", 1))
+        following = asyncio.create_task(admission.admit("c", 1))
+        await settle()
+        cancelled.cancel()
+        await settle()
+        assert admission.queued == 1
+        admission.release("a")
+        await following
+        assert cancelled.cancelled()
+        assert admission.stats()["active"] == 1
+    asyncio.run(main())
+
+def test_full_queue_rejects():
+    async def main():
+        admission = controller(queue_size=1)
+        await admission.admit("a", 1)
+        waiting = asyncio.create_task(admission.admit("a", 1))
+        await settle()
+        with pytest.raises(Overloaded) as error:
+            await admission.admit("b", 1)
+        assert error.value.reason == "queue full"
+        waiting.cancel()
+    asyncio.run(main())
+
+def test_client_inflight_limit_counts_waiting_requests():
+    async def main():
+        admission = controller(client_inflight=2)
+        await admission.admit("a", 1)
+        waiting = asyncio.create_task(admission.admit("a", 1))
+        await settle()
+        with pytest.raises(Overloaded) as error:
+            await admission.admit("a", 1)
+        assert error.value.reason == "too many requests in flight"
+        waiting.cancel()
+    asyncio.run(main())
+
+def test_rate_limit_charges_extractions_after_the_request():
+    async def main():
+        admission = controller(capacity=10, client_rate=1, client_burst=5)
+        # Requests served from the caches only cost their admission
+        for _ in range(4):
+            await admission.admit("a", 101)
+            admission.release("a")
+        await admission.admit("a", 1)
+        admission.charge("a", 100)
+        admission.release("a")
+        with pytest.raises(Overloaded) as error:
+            await admission.admit("a", 1)
+        assert error.value.reason == "rate limit exceeded"
+        # The debt is capped at one full bucket
+        assert 5 < error.value.retry_after <= 6.1
+        await admission.admit("b", 1)
+    asyncio.run(main())
+
+def test_work_is_recorded_per_thread():
+    record_work()
+    record_work(3)
+    assert collect_work() == 4
+    assert collect_work() == 0
@@ -0,0 +1,64 @@
+# Import dependencies
+from time import time
+
+# Import local dependencies
+from src.cache import LRUCache, SearchCache, StreamCache
+
+def tracks(count: int) -> list[dict]:
+    return [{"id": str(index), "title": f"Track {index}"} for index in range(count)]
+
+def test_smaller_amounts_are_served_from_a_larger_search():
+    cache = SearchCache(16, 60)
+    cache.put_results("youtube", "Some Song", 10, tracks(10))
+    assert [data["id"] for data in cache.get_results("youtube", "  some   SONG ", 3)] == ["0", "1", "2"]
+    assert len(cache.get_results("youtube", "some song", 10)) == 10
+
+def test_larger_amounts_miss_unless_the_search_was_exhausted():
+    cache = SearchCache(16, 60)
+    cache.put_results("youtube", "popular", 5, tracks(5))
+    assert cache.get_results("youtube", "popular", 6) is None
+    # Asking for 10 and getting 4 means there are no more results, so any amount is answered
+    cache.put_results("youtube", "rare", 10, tracks(4))
+    assert len(cache.get_results("youtube", "rare", 50)) == 4
+
+def test_search_results_are_copies():
+    cache = SearchCache(16, 60)
+    results = tracks(2)
+    cache.put_results("youtube", "query", 2, results)
+    results[0]["source"] = "changed"
+    served = cache.get_results("youtube", "query", 2)
+    served[1]["source"] = "changed"
+    assert all("source" not in data for data in cache.get_results("youtube", "query", 2))
+
+def test_services_do_not_share_entries():
+    cache = SearchCache(16, 60)
+    cache.put_results("youtube", "query", 1, tracks(1))
+    assert cache.get_results("http", "query", 1) is None
+
+def test_expired_entries_are_dropped():
+    cache = LRUCache(10)
+    cache.put("gone", 1, -1)
+    cache.put("kept", 2, 60)
+    assert cache.get("gone") is None
+    assert cache.get("kept") == 2
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    cache = LRUCache(10)
+    cache.put("a", 1, 60, size=4)
+    cache.put("b", 2, 60, size=4)
+    cache.get("a")
+    cache.put("c", 3, 60, size=4)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+    # Entries larger than the whole budget are never stored
+    cache.put("huge", 4, 60, size=11)
+    assert cache.get("huge") is None
+
+def test_stream_urls_expire_before_their_own_expiry_time():
+    cache = StreamCache(1 << 20, expiry_margin=600, default_ttl=1800)
+    assert cache.ttl_for("https://example.com/stream") == 1800
+    expire = int(time()) + 3600
+    assert 2990 < cache.ttl_for(f"https://example.com/stream?expire={expire}&x=1") <= 3000
+    cache.put_source("soon", f"https://example.com/stream?expire={int(time()) + 300}")
+    assert cache.get("soon") is None
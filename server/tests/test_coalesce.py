@@ -0,0 +1,62 @@
+# Import dependencies
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from time import monotonic
+import pytest
+
+# Import local dependencies
+from src.coalesce import SingleFlight
+
+def wait_until(condition, timeout: float = 5):
+    deadline = monotonic() + timeout
+    while not condition():
+        assert monotonic() < deadline, "timed out"
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    started, release = Event(), Event()
+    calls = []
+    def work(value: int) -> int:
+        calls.append(value)
+        started.set()
+        release.wait(5)
+        return value * 2
+    with ThreadPoolExecutor(4) as pool:
+        leader = pool.submit(flight.do, "key", work, 21)
+        started.wait(5)
+        followers = [pool.submit(flight.do, "key", work, 0) for _ in range(3)]
+        wait_until(lambda: flight.coalesced == 3)
+        release.set()
+        assert [future.result(5) for future in [leader, *followers]] == [42] * 4
+    assert calls == [21]
+    assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 3}
+
+def test_failure_reaches_every_caller_and_frees_the_key():
+    flight = SingleFlight()
+    started, release = Event(), Event()
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("extraction failed")
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "key", fail)
+        started.wait(5)
+        follower = pool.submit(flight.do, "key", fail)
+        wait_until(lambda: flight.coalesced == 1)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(ValueError, match="extraction failed"):
+                future.result(5)
+    # A failed call is not cached, so the next caller runs again
+    assert flight.do("key", lambda: "retried") == "retried"
+    assert flight.stats()["in_flight"] == 0
+
+def test_fail_and_resolve_of_unknown_keys():
+    flight = SingleFlight()
+    assert flight.fail("missing", ValueError()) is False
+    flight.resolve("missing", 1)
+    future, leader = flight.claim("key")
+    assert leader
+    assert flight.fail("key", KeyError("gone")) is True
+    with pytest.raises(KeyError):
+        future.result(0)
@@ -0,0 +1,116 @@
+# Import dependencies
+import asyncio
+import json
+import zlib
+import pytest
+
+# Import local dependencies
+from src.protocol.framing import Codec, FrameError, HEADER, COMPRESSED, recv_frame, handshake
+
+def body(frame: bytes) -> tuple[bytes, bool]:
+    (length,) = HEADER.unpack(frame[:HEADER.size])
+    return frame[HEADER.size:], bool(length & COMPRESSED)
+
+def test_json_round_trip():
+    codec = Codec()
+    message = {"id": 1, "response": [{"title": "Ünïcode"}]}
+    data, compressed = body(codec.encode(message))
+    assert not compressed
+    assert codec.decode(data, compressed) == message
+
+def test_large_bodies_are_compressed():
+    codec = Codec("json", "zlib", compression_threshold=100)
+    message = {"response": "x" * 1000}
+    data, compressed = body(codec.encode(message))
+    assert compressed and len(data) < 1000
+    assert codec.decode(data, compressed) == message
+
+@pytest.mark.parametrize("data, compressed", [
+    (b"{not json", False),
+    (b"\xff\xfe", False),
+    (b"not zlib at all", True)
+])
+def test_malformed_bodies_raise_frame_errors(data: bytes, compressed: bool):
+    with pytest.raises(FrameError):
+        Codec("json", "zlib").decode(data, compressed)
+
+def test_compressed_frame_without_negotiation_is_refused():
+    with pytest.raises(FrameError, match="without negotiating"):
+        Codec().decode(zlib.compress(b"{}"), True)
+
+def test_decompressed_size_is_capped():
+    bomb = zlib.compress(json.dumps({"padding": " " * 100000}).encode())
+    with pytest.raises(FrameError, match="exceeds"):
+        Codec("json", "zlib").decode(bomb, True, max_size=1000)
+
+def test_msgpack_round_trip_and_errors():
+    pytest.importorskip("msgpack")
+    codec = Codec("msgpack")
+    message = {"id": 2, "response": [1, 2, 3]}
+    assert codec.decode(*body(codec.encode(message))) == message
+    with pytest.raises(FrameError):
+        codec.decode(b"\xc1")
+
+def reader(*frames: bytes) -> asyncio.StreamReader:
+    stream = asyncio.StreamReader()
+    for frame in frames:
+        stream.feed_data(frame)
+    stream.feed_eof()
+    return stream
+
+def test_oversized_frame_header_is_refused():
+    async def main():
+        with pytest.raises(FrameError):
+            await recv_frame(reader(HEADER.pack(1001)), max_size=1000)
+    asyncio.run(main())
+
+def test_clean_and_truncated_ends_of_stream():
+    async def main():
+        assert await recv_frame(reader()) is None
+        with pytest.raises(ConnectionResetError):
+            await recv_frame(reader(HEADER.pack(10) + b"short"))
+    asyncio.run(main())
+
+class Writer(object):
+    '''Collects the frames the server sends during a handshake'''
+
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frame: bytes):
+        self.frames.append(json.loads(body(frame)[0]))
+
+    async def drain(self):
+        pass
+
+def hello(message) -> bytes:
+    return Codec().encode(message)
+
+def test_handshake_negotiates_offers():
+    async def main():
+        writer = Writer()
+        codec = await handshake(reader(hello({"flexmusic": 2, "encodings": ["cbor", "json"], "compression": ["zlib"]})), writer)
+        assert (codec.encoding, codec.compression) == ("json", "zlib")
+        assert writer.frames[0]["success"] is True
+    asyncio.run(main())
+
+def test_handshake_accepts_version_one_and_refuses_unknown_versions():
+    async def main():
+        codec = await handshake(reader(hello({"flexmusic": 1})), Writer())
+        assert (codec.encoding, codec.compression) == ("json", None)
+        writer = Writer()
+        assert await handshake(reader(hello({"flexmusic": 99})), writer) is None
+        assert writer.frames[0]["success"] is False
+    asyncio.run(main())
+
+@pytest.mark.parametrize("message", [
+    ["flexmusic", 2],
+    {"flexmusic": 2, "encodings": "json"},
+    {"flexmusic": 2, "compression": True},
+    {"flexmusic": 2, "encodings": [["json"]]}
+])
+def test_malformed_handshakes_raise_frame_errors(message):
+    async def main():
+        with pytest.raises(FrameError):
+            await handshake(reader(hello(message)), Writer())
+    asyncio.run(main())